@@ -0,0 +1,319 @@
+from logic import Sentence, Symbol, Not, And, Or, Implication, Biconditional
+
+
+class BDD():
+    """
+    Reduced ordered binary decision diagrams.
+
+    Nodes are integers: 0 and 1 are the false and true terminals, and any
+    other node n tests the variable at position self.levels[n] of the
+    order, continuing to self.lows[n] if it is false and self.highs[n] if
+    it is true. A unique table keeps one node per (level, low, high), so
+    equal functions are equal nodes, and an operation cache makes every
+    operation run in time linear in the sizes of the diagrams involved.
+
+    Neither operations nor compiling sentences recurse, so the number of
+    variables and the nesting of sentences are limited only by memory,
+    not by the recursion limit.
+    """
+
+    def __init__(self, order=()):
+        self.order = []
+        self.positions = dict()
+        self.levels = [None, None]
+        self.lows = [None, None]
+        self.highs = [None, None]
+        self.unique = dict()
+        self.cache = dict()
+        for name in order:
+            self.add_variable(name)
+
+    def __len__(self):
+        return len(self.levels)
+
+    def add_variable(self, name):
+        """Adds a variable below all existing ones in the order."""
+        if name not in self.positions:
+            self.positions[name] = len(self.order)
+            self.order.append(name)
+
+    def level(self, node):
+        """Returns the position of the variable a node tests."""
+        if node < 2:
+            return len(self.order)
+        return self.levels[node]
+
+    def node(self, level, low, high):
+        """Returns the node testing `level`, reduced and made unique."""
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self.unique.get(key)
+        if node is None:
+            node = self.unique[key] = len(self.levels)
+            self.levels.append(level)
+            self.lows.append(low)
+            self.highs.append(high)
+        return node
+
+    def variable(self, name):
+        """Returns the node that is true exactly when `name` is."""
+        self.add_variable(name)
+        return self.node(self.positions[name], 0, 1)
+
+    def ite(self, f, g, h):
+        """
+        Returns the node for "if f then g else h".
+
+        Each call splits on the topmost variable tested by any operand and
+        combines the results for either value of it. Calls still to make
+        and results waiting to be combined are kept on explicit stacks
+        instead of recursing, one level of the order at a time.
+        """
+        calls = [(f, g, h)]
+        results = []
+        while calls:
+            call = calls.pop()
+            if call[0] is None:
+                _, key, level = call
+                high = results.pop()
+                low = results.pop()
+                results.append(self.combine(key, level, low, high))
+                continue
+            result = self.known(*call)
+            if result is not None:
+                results.append(result)
+                continue
+
+            level = min(self.level(n) for n in call)
+            calls.append((None, call, level))
+            calls.append(tuple(self.cofactor(n, level, True) for n in call))
+            calls.append(tuple(self.cofactor(n, level, False) for n in call))
+        return results.pop()
+
+    def known(self, f, g, h):
+        """
+        Returns the node for "if f then g else h" if it is immediate or
+        already cached, or else None.
+        """
+        if f == 1:
+            return g
+        if f == 0:
+            return h
+        if g == h:
+            return g
+        if g == 1 and h == 0:
+            return f
+        return self.cache.get((f, g, h))
+
+    def combine(self, key, level, low, high):
+        """Caches and returns the node for `key` split at `level`."""
+        result = self.cache[key] = self.node(level, low, high)
+        return result
+
+    def cofactor(self, node, level, value):
+        """Returns `node` with the variable at `level` set to `value`."""
+        if self.level(node) != level:
+            return node
+        return self.highs[node] if value else self.lows[node]
+
+    def negate(self, f):
+        return self.ite(f, 0, 1)
+
+    def conjoin(self, f, g):
+        return self.ite(f, g, 0)
+
+    def disjoin(self, f, g):
+        return self.ite(f, 1, g)
+
+    def implies(self, f, g):
+        return self.ite(f, g, 1)
+
+    def equivalent(self, f, g):
+        return self.ite(f, g, self.negate(g))
+
+    def compile(self, sentence):
+        """Returns the node representing a logical sentence."""
+        Sentence.validate(sentence)
+        for name in variable_order(sentence):
+            self.add_variable(name)
+        nodes = dict()
+
+        def build(sentence):
+            """Returns the node of a sentence whose subsentences are built."""
+            if isinstance(sentence, Symbol):
+                return self.variable(sentence.name)
+            children = [nodes[id(child)] for child in sentence.children()]
+            if isinstance(sentence, Not):
+                return self.negate(children[0])
+            if isinstance(sentence, And):
+                return self.fold(self.conjoin, children, 1)
+            if isinstance(sentence, Or):
+                return self.fold(self.disjoin, children, 0)
+            if isinstance(sentence, Implication):
+                return self.implies(*children)
+            if isinstance(sentence, Biconditional):
+                return self.equivalent(*children)
+            raise TypeError("must be a logical sentence")
+
+        # Build subsentences before the sentences containing them
+        stack = [sentence]
+        while stack:
+            current = stack[-1]
+            if id(current) in nodes:
+                stack.pop()
+                continue
+            Sentence.validate(current)
+            pending = [child for child in current.children()
+                       if id(child) not in nodes]
+            if pending:
+                stack.extend(reversed(pending))
+            else:
+                stack.pop()
+                nodes[id(current)] = build(current)
+        return nodes[id(sentence)]
+
+    @staticmethod
+    def fold(operation, nodes, empty):
+        """
+        Combines nodes by a binary operation in pairs, then pairs of those
+        and so on, so that operands mostly stay small diagrams over nearby
+        variables instead of each joining one ever larger result. Returns
+        `empty` if there are no nodes.
+        """
+        if not nodes:
+            return empty
+        while len(nodes) > 1:
+            nodes = [
+                operation(*nodes[i:i + 2]) if i + 1 < len(nodes) else nodes[i]
+                for i in range(0, len(nodes), 2)
+            ]
+        return nodes[0]
+
+    def reachable(self, node):
+        """Returns the nodes reachable from `node`, parents before children."""
+        seen = {node}
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current >= 2:
+                for child in (self.lows[current], self.highs[current]):
+                    if child not in seen:
+                        seen.add(child)
+                        stack.append(child)
+        return sorted(seen, key=self.level)
+
+    def size(self, node):
+        """Returns the number of nodes in the diagram rooted at `node`."""
+        return len(self.reachable(node))
+
+    def count(self, node):
+        """
+        Returns the number of models of `node` over all variables in the
+        order, in time linear in the size of its diagram.
+        """
+        counts = {0: 0, 1: 1}
+        for current in reversed(self.reachable(node)):
+            if current < 2:
+                continue
+            level = self.levels[current]
+            low, high = self.lows[current], self.highs[current]
+            counts[current] = (
+                counts[low] << (self.level(low) - level - 1)
+            ) + (
+                counts[high] << (self.level(high) - level - 1)
+            )
+        return counts[node] << self.level(node)
+
+    def entails(self, knowledge, query):
+        """Checks if the node `knowledge` entails the node `query`."""
+        return self.implies(knowledge, query) == 1
+
+    def implied_values(self, node):
+        """
+        Returns a dictionary from each variable whose value is the same in
+        every model of `node` to that value, in time linear in the size of
+        its diagram. An unsatisfiable node implies nothing here.
+        """
+        if node == 0:
+            return dict()
+        levels = len(self.order)
+        can_be = [[False, False] for _ in range(levels)]
+
+        # Variables skipped by an edge on a path to 1 can take either value
+        free = [0] * (levels + 1)
+
+        def skip(above, below):
+            if above + 1 < below:
+                free[above + 1] += 1
+                free[below] -= 1
+
+        skip(-1, self.level(node))
+        for current in self.reachable(node):
+            if current < 2:
+                continue
+            level = self.levels[current]
+            for value, child in enumerate((self.lows[current],
+                                           self.highs[current])):
+                if child != 0:
+                    can_be[level][value] = True
+                    skip(level, self.level(child))
+
+        implied = dict()
+        skipped = 0
+        for level, name in enumerate(self.order):
+            skipped += free[level]
+            if skipped:
+                continue
+            false, true = can_be[level]
+            if true != false:
+                implied[name] = true
+        return implied
+
+
+def variable_order(sentence):
+    """
+    Returns the symbols of a logical sentence in the order a depth-first,
+    left-to-right walk first meets them, which keeps symbols used together
+    close together in the order.
+    """
+    order = dict()
+    stack = [sentence]
+    while stack:
+        sentence = stack.pop()
+        if isinstance(sentence, Symbol):
+            order.setdefault(sentence.name, None)
+        else:
+            stack.extend(reversed(sentence.children()))
+    return list(order)
+
+
+class CompiledKnowledge():
+    """
+    Knowledge base compiled once into a decision diagram, so that each
+    later entailment query, model count or implied value costs time linear
+    in the diagram rather than a new search.
+    """
+
+    def __init__(self, knowledge):
+        self.bdd = BDD(variable_order(knowledge))
+        self.root = self.bdd.compile(knowledge)
+        self.variables = len(self.bdd.order)
+
+    def entails(self, query):
+        """Checks if the knowledge base entails the query."""
+        return self.bdd.entails(self.root, self.bdd.compile(query))
+
+    def count(self):
+        """Returns the number of models of the knowledge base."""
+
+        # Symbols first seen in queries were added below the knowledge base
+        extra = len(self.bdd.order) - self.variables
+        return self.bdd.count(self.root) >> extra
+
+    def implied_values(self):
+        """
+        Returns a dictionary from each symbol whose value is fixed by the
+        knowledge base to that value.
+        """
+        return self.bdd.implied_values(self.root)
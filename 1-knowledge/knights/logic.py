@@ -1,19 +1,65 @@
+import functools
+import heapq
 import itertools
+import re
+import weakref
 
 
 class Sentence():
 
+    # Interned sentences cache their hash and, once asked, their symbols;
+    # a sentence is interned exactly when _hash is set
+    __slots__ = ("_hash", "_symbols", "__weakref__")
+
+    def __init__(self):
+        self._hash = None
+        self._symbols = None
+
     def evaluate(self, model):
         """Evaluates the logical sentence."""
         raise Exception("nothing to evaluate")
 
+    def evaluate_partial(self, model):
+        """
+        Evaluates the logical sentence in a model that may leave symbols
+        unassigned. Returns True or False if every completion of the model
+        agrees on that value, and None if the value is not yet decided.
+        """
+        raise Exception("nothing to evaluate")
+
     def formula(self):
         """Returns string formula representing logical sentence."""
         return ""
 
+    def children(self):
+        """Returns a tuple of the immediate subsentences."""
+        return ()
+
     def symbols(self):
         """Returns a set of all symbols in the logical sentence."""
-        return set()
+        if self._hash is None:
+            return self.collect_symbols()
+        if self._symbols is None:
+            self._symbols = frozenset(self.collect_symbols())
+        return set(self._symbols)
+
+    def collect_symbols(self):
+        """Walks the sentence without recursion, collecting its symbols."""
+        symbols = set()
+        stack = [self]
+        while stack:
+            sentence = stack.pop()
+            if sentence._symbols is not None:
+                symbols.update(sentence._symbols)
+            elif isinstance(sentence, Symbol):
+                symbols.add(sentence.name)
+            else:
+                stack.extend(sentence.children())
+        return symbols
+
+    def is_interned(self):
+        """Checks if the sentence is an interned, immutable node."""
+        return self._hash is not None
 
     @classmethod
     def validate(cls, sentence):
@@ -44,13 +90,18 @@ class Sentence():
 
 class Symbol(Sentence):
 
+    __slots__ = ("name",)
+
     def __init__(self, name):
+        Sentence.__init__(self)
         self.name = name
 
     def __eq__(self, other):
         return isinstance(other, Symbol) and self.name == other.name
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(("symbol", self.name))
 
     def __repr__(self):
@@ -62,6 +113,10 @@ class Symbol(Sentence):
         except KeyError:
             raise Exception(f"variable {self.name} not in model")
 
+    def evaluate_partial(self, model):
+        value = model.get(self.name)
+        return None if value is None else bool(value)
+
     def formula(self):
         return self.name
 
@@ -70,14 +125,22 @@ class Symbol(Sentence):
 
 
 class Not(Sentence):
+
+    __slots__ = ("operand",)
+
     def __init__(self, operand):
+        Sentence.__init__(self)
         Sentence.validate(operand)
         self.operand = operand
 
     def __eq__(self, other):
-        return isinstance(other, Not) and self.operand == other.operand
+        return self is other or (
+            isinstance(other, Not) and self.operand == other.operand
+        )
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(("not", hash(self.operand)))
 
     def __repr__(self):
@@ -86,23 +149,35 @@ class Not(Sentence):
     def evaluate(self, model):
         return not self.operand.evaluate(model)
 
+    def evaluate_partial(self, model):
+        value = self.operand.evaluate_partial(model)
+        return None if value is None else not value
+
     def formula(self):
         return "¬" + Sentence.parenthesize(self.operand.formula())
 
-    def symbols(self):
-        return self.operand.symbols()
+    def children(self):
+        return (self.operand,)
 
 
 class And(Sentence):
+
+    __slots__ = ("conjuncts",)
+
     def __init__(self, *conjuncts):
+        Sentence.__init__(self)
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
         self.conjuncts = list(conjuncts)
 
     def __eq__(self, other):
-        return isinstance(other, And) and self.conjuncts == other.conjuncts
+        return self is other or (
+            isinstance(other, And) and self.conjuncts == other.conjuncts
+        )
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(
             ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
         )
@@ -114,32 +189,62 @@ class And(Sentence):
         return f"And({conjunctions})"
 
     def add(self, conjunct):
+        if self._hash is not None:
+            raise TypeError("interned sentence is immutable; "
+                            "use with_conjunct instead")
         Sentence.validate(conjunct)
         self.conjuncts.append(conjunct)
 
+    def with_conjunct(self, conjunct):
+        """
+        Returns a new conjunction with `conjunct` added at the end,
+        leaving this one unchanged. Interned conjunctions stay interned.
+        """
+        if self._hash is not None:
+            return interned(And, *self.conjuncts, intern(conjunct))
+        return And(*self.conjuncts, conjunct)
+
     def evaluate(self, model):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
 
+    def evaluate_partial(self, model):
+        result = True
+        for conjunct in self.conjuncts:
+            value = conjunct.evaluate_partial(model)
+            if value is False:
+                return False
+            if value is None:
+                result = None
+        return result
+
     def formula(self):
         if len(self.conjuncts) == 1:
             return self.conjuncts[0].formula()
         return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
                            for conjunct in self.conjuncts])
 
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+    def children(self):
+        return tuple(self.conjuncts)
 
 
 class Or(Sentence):
+
+    __slots__ = ("disjuncts",)
+
     def __init__(self, *disjuncts):
+        Sentence.__init__(self)
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
         self.disjuncts = list(disjuncts)
 
     def __eq__(self, other):
-        return isinstance(other, Or) and self.disjuncts == other.disjuncts
+        return self is other or (
+            isinstance(other, Or) and self.disjuncts == other.disjuncts
+        )
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(
             ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
         )
@@ -151,29 +256,47 @@ class Or(Sentence):
     def evaluate(self, model):
         return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
 
+    def evaluate_partial(self, model):
+        result = False
+        for disjunct in self.disjuncts:
+            value = disjunct.evaluate_partial(model)
+            if value is True:
+                return True
+            if value is None:
+                result = None
+        return result
+
     def formula(self):
         if len(self.disjuncts) == 1:
             return self.disjuncts[0].formula()
         return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
                             for disjunct in self.disjuncts])
 
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+    def children(self):
+        return tuple(self.disjuncts)
 
 
 class Implication(Sentence):
+
+    __slots__ = ("antecedent", "consequent")
+
     def __init__(self, antecedent, consequent):
+        Sentence.__init__(self)
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
         self.antecedent = antecedent
         self.consequent = consequent
 
     def __eq__(self, other):
-        return (isinstance(other, Implication)
-                and self.antecedent == other.antecedent
-                and self.consequent == other.consequent)
+        return self is other or (
+            isinstance(other, Implication)
+            and self.antecedent == other.antecedent
+            and self.consequent == other.consequent
+        )
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(("implies", hash(self.antecedent), hash(self.consequent)))
 
     def __repr__(self):
@@ -183,81 +306,1075 @@ class Implication(Sentence):
         return ((not self.antecedent.evaluate(model))
                 or self.consequent.evaluate(model))
 
+    def evaluate_partial(self, model):
+        antecedent = self.antecedent.evaluate_partial(model)
+        if antecedent is False:
+            return True
+        consequent = self.consequent.evaluate_partial(model)
+        if consequent is True:
+            return True
+        if antecedent is True and consequent is False:
+            return False
+        return None
+
     def formula(self):
         antecedent = Sentence.parenthesize(self.antecedent.formula())
         consequent = Sentence.parenthesize(self.consequent.formula())
         return f"{antecedent} => {consequent}"
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
+    def children(self):
+        return (self.antecedent, self.consequent)
 
 
 class Biconditional(Sentence):
+
+    __slots__ = ("left", "right")
+
     def __init__(self, left, right):
+        Sentence.__init__(self)
         Sentence.validate(left)
         Sentence.validate(right)
         self.left = left
         self.right = right
 
     def __eq__(self, other):
-        return (isinstance(other, Biconditional)
-                and self.left == other.left
-                and self.right == other.right)
+        return self is other or (
+            isinstance(other, Biconditional)
+            and self.left == other.left
+            and self.right == other.right
+        )
 
     def __hash__(self):
+        if self._hash is not None:
+            return self._hash
         return hash(("biconditional", hash(self.left), hash(self.right)))
 
     def __repr__(self):
         return f"Biconditional({self.left}, {self.right})"
 
     def evaluate(self, model):
-        return ((self.left.evaluate(model)
-                 and self.right.evaluate(model))
-                or (not self.left.evaluate(model)
-                    and not self.right.evaluate(model)))
+        return self.left.evaluate(model) == self.right.evaluate(model)
+
+    def evaluate_partial(self, model):
+        left = self.left.evaluate_partial(model)
+        if left is None:
+            return None
+        right = self.right.evaluate_partial(model)
+        if right is None:
+            return None
+        return left == right
 
     def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
+        left = Sentence.parenthesize(self.left.formula())
+        right = Sentence.parenthesize(self.right.formula())
         return f"{left} <=> {right}"
 
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
+    def children(self):
+        return (self.left, self.right)
+
+
+# Weak references to interned sentences, each mapped to itself. A live
+# reference hashes and compares like its sentence, and since operands are
+# interned, that only looks at immediate operands. Nothing here keeps a
+# sentence alive, and its entry is removed once it is freed
+interned_sentences = dict()
+
+
+def interned(cls, *operands):
+    """
+    Returns the interned sentence cls(*operands), creating it if needed.
+    Operands must themselves be interned; for a Symbol, pass its name.
+    """
+    sentence = cls(*operands)
+    reference = interned_sentences.get(weakref.ref(sentence))
+    if reference is not None:
+        existing = reference()
+        if existing is not None:
+            return existing
+    sentence._hash = hash(sentence)
+    reference = weakref.ref(sentence, forget)
+    interned_sentences[reference] = reference
+    return sentence
+
+
+def forget(reference, table=interned_sentences):
+    """Removes the entry of an interned sentence that has been freed."""
+    table.pop(reference, None)
+
+
+def intern(sentence):
+    """
+    Returns the interned copy of a logical sentence.
+
+    Structurally equal sentences intern to one shared node, which must not
+    be mutated; its hash is computed once, and so is its symbol set. Nodes
+    are interned children first from an explicit stack rather than by
+    recursion, so deeply nested sentences do not hit the recursion limit.
+    """
+    copies = dict()
+
+    def copy(node):
+        if node._hash is not None:
+            return node
+        return copies[id(node)]
+
+    Sentence.validate(sentence)
+    stack = [sentence]
+    while stack:
+        node = stack[-1]
+        if node._hash is not None or id(node) in copies:
+            stack.pop()
+            continue
+        pending = [child for child in node.children()
+                   if child._hash is None and id(child) not in copies]
+        if pending:
+            stack.extend(reversed(pending))
+        elif isinstance(node, Symbol):
+            stack.pop()
+            copies[id(node)] = interned(Symbol, node.name)
+        else:
+            stack.pop()
+            copies[id(node)] = interned(
+                type(node), *[copy(child) for child in node.children()]
+            )
+    return copy(sentence)
+
+
+# Operators in the syntax produced by Sentence.formula
+OPERATORS = re.compile(r"<=>|=>|[¬∧∨()]")
+
+
+def tokenize(text):
+    """
+    Splits a formula into operators and symbol names. A name is whatever
+    text lies between two operators, with surrounding whitespace removed.
+    """
+    tokens = []
+    start = 0
+    for match in OPERATORS.finditer(text):
+        name = text[start:match.start()].strip()
+        if name:
+            tokens.append((None, name))
+        tokens.append((match.group(), None))
+        start = match.end()
+    name = text[start:].strip()
+    if name:
+        tokens.append((None, name))
+    return tokens
+
+
+# Binary operators by binding strength, with the class each one builds
+BINARY = {
+    "<=>": (1, Biconditional),
+    "=>": (2, Implication),
+    "∨": (3, Or),
+    "∧": (4, And),
+}
+
+
+def parse(text):
+    """
+    Parses a formula written as Sentence.formula writes it, such as
+    "(A is a Knight) <=> ¬B", into an interned logical sentence.
+
+    Biconditional binds loosest, then implication, disjunction,
+    conjunction and negation; chains of ∧ or ∨ become a single And or Or,
+    and => and <=> group to the right.
+    """
+    operands = []
+
+    # Pending operators, each with the number of operands it joins so far
+    operators = []
+
+    def reduce():
+        operator, count = operators.pop()
+        if operator == "¬":
+            operands[-1] = interned(Not, operands[-1])
+        else:
+            arguments = operands[-count:]
+            del operands[-count:]
+            operands.append(interned(BINARY[operator][1], *arguments))
+
+    def complete():
+        """Applies negations waiting for the operand just completed."""
+        while operators and operators[-1][0] == "¬":
+            reduce()
+
+    expecting = True
+    for operator, name in tokenize(text):
+        token = operator or name
+        if operator in (None, "¬", "("):
+            if not expecting:
+                raise ValueError(f"unexpected {token}")
+            if operator is None:
+                operands.append(interned(Symbol, name))
+                expecting = False
+                complete()
+            else:
+                operators.append([operator, 1])
+        elif expecting:
+            raise ValueError(f"expected symbol, found {token}")
+        elif operator == ")":
+            while operators and operators[-1][0] != "(":
+                reduce()
+            if not operators:
+                raise ValueError("unexpected )")
+            operators.pop()
+            complete()
+        else:
+            strength = BINARY[operator][0]
+            while (operators and operators[-1][0] in BINARY
+                   and BINARY[operators[-1][0]][0] > strength):
+                reduce()
+
+            # Extend a chain of the same ∧ or ∨ rather than nesting it
+            if (operator in ("∧", "∨") and operators
+                    and operators[-1][0] == operator):
+                operators[-1][1] += 1
+            else:
+                operators.append([operator, 2])
+            expecting = True
+
+    if expecting:
+        raise ValueError("expected symbol, found end of formula")
+    while operators:
+        if operators[-1][0] == "(":
+            raise ValueError("expected ), found end of formula")
+        reduce()
+    return operands[0]
+
+
+def load(lines):
+    """
+    Reads a knowledge base written one formula per line, from a file or any
+    iterable of lines, and returns the conjunction of the formulas. Blank
+    lines and lines starting with # are skipped.
+    """
+    conjuncts = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            conjuncts.append(parse(line))
+        except ValueError as e:
+            raise ValueError(f"line {number}: {e}") from None
+    return interned(And, *conjuncts)
+
+
+def load_dimacs(lines):
+    """
+    Reads a CNF formula in DIMACS format, from a file or any iterable of
+    lines, and returns it as a conjunction of disjunctions. Variable n
+    becomes the symbol named "n". Reading stops at a line starting with %,
+    which SATLIB files use to begin a trailer that is not part of the
+    formula.
+    """
+    conjuncts = []
+    literals = []
+    cache = dict()
+    for line in lines:
+        line = line.strip()
+        if line.startswith("%"):
+            break
+        if line.startswith(("c", "p")):
+            continue
+        for token in line.split():
+            value = int(token)
+            if value == 0:
+                conjuncts.append(interned(Or, *literals))
+                literals = []
+            elif value in cache:
+                literals.append(cache[value])
+            else:
+                literal = interned(Symbol, str(abs(value)))
+                if value < 0:
+                    literal = interned(Not, literal)
+                cache[value] = literal
+                literals.append(literal)
+    if literals:
+        conjuncts.append(interned(Or, *literals))
+    return interned(And, *conjuncts)
+
+
+class CompiledSentence():
+    """
+    Logical sentence lowered to a generated Python function, for evaluating
+    it in many models.
+
+    Models are given by position instead of by name: `evaluate` takes a
+    tuple of truth values ordered like `symbols`, and `evaluate_bits` takes
+    an integer whose bit i is the value of symbols[i]. `evaluate_table`
+    evaluates many models at once; see `truth_table`. Each function is
+    generated the first time it is used.
+    """
+
+    def __init__(self, sentence, symbols=None):
+        Sentence.validate(sentence)
+        if symbols is None:
+            symbols = sorted(sentence.symbols())
+        self.sentence = sentence
+        self.symbols = tuple(symbols)
+
+    @functools.cached_property
+    def source(self):
+        return self.lower(self.sentence, [
+            f"m[{i}]" for i in range(len(self.symbols))
+        ])
+
+    @functools.cached_property
+    def evaluate(self):
+        return self.define(self.source)
+
+    @functools.cached_property
+    def source_bits(self):
+        return self.lower(self.sentence, [
+            f"m >> {i} & 1" for i in range(len(self.symbols))
+        ])
+
+    @functools.cached_property
+    def evaluate_bits(self):
+        return self.define(self.source_bits)
+
+    @functools.cached_property
+    def source_table(self):
+        return self.lower(self.sentence, [
+            f"m[{i}]" for i in range(len(self.symbols))
+        ], table=True)
+
+    @functools.cached_property
+    def evaluate_table(self):
+        return self.define(self.source_table)
 
+    def __repr__(self):
+        return f"CompiledSentence({', '.join(self.symbols)})"
+
+    def lower(self, sentence, inputs, table=False):
+        """
+        Returns the source of a function of one argument `m` evaluating
+        `sentence`, where inputs[i] is the expression reading symbols[i].
+
+        Every node becomes one straight-line assignment to a local, so each
+        shared subsentence is evaluated once. Nodes are lowered children
+        first from an explicit stack rather than by recursion, so deeply
+        nested sentences do not hit the recursion limit. Top-level
+        conjuncts or disjuncts are checked in order, returning early.
+
+        If `table` is true, the function instead takes `(m, ones)` where each
+        input is a column of bits, one per model, and `ones` has every bit
+        of the column set; it returns the column of values of `sentence`.
+        """
+        index = {name: i for i, name in enumerate(self.symbols)}
+        lines = []
+        names = dict()
+
+        def name(root):
+            """Lowers a node and its subsentences, returning its local."""
+            stack = [root]
+            while stack:
+                node = stack[-1]
+                if id(node) in names:
+                    stack.pop()
+                    continue
+                Sentence.validate(node)
+                pending = [child for child in node.children()
+                           if id(child) not in names]
+                if pending:
+                    stack.extend(reversed(pending))
+                else:
+                    stack.pop()
+                    names[id(node)] = emit(node)
+            return names[id(root)]
+
+        def local(node):
+            return names[id(node)]
+
+        def emit(node):
+            """Emits a node whose subsentences are already lowered."""
+            if isinstance(node, Symbol):
+                if node.name not in index:
+                    raise Exception(f"variable {node.name} not in model")
+                expression = inputs[index[node.name]]
+            elif isinstance(node, Not):
+                operand = local(node.operand)
+                expression = f"{operand} ^ ones" if table else f"not {operand}"
+            elif isinstance(node, And):
+                operands = [local(conjunct) for conjunct in node.conjuncts]
+                if table:
+                    expression = " & ".join(operands) or "ones"
+                else:
+                    expression = " and ".join(operands) or "True"
+            elif isinstance(node, Or):
+                operands = [local(disjunct) for disjunct in node.disjuncts]
+                if table:
+                    expression = " | ".join(operands) or "0"
+                else:
+                    expression = " or ".join(operands) or "False"
+            elif isinstance(node, Implication):
+                antecedent = local(node.antecedent)
+                consequent = local(node.consequent)
+                if table:
+                    expression = f"({antecedent} ^ ones) | {consequent}"
+                else:
+                    expression = f"not {antecedent} or {consequent}"
+            elif isinstance(node, Biconditional):
+                left = local(node.left)
+                right = local(node.right)
+                if table:
+                    expression = f"{left} ^ {right} ^ ones"
+                else:
+                    expression = f"(not {left}) == (not {right})"
+            else:
+                raise TypeError("must be a logical sentence")
+            variable = f"t{len(lines)}"
+            lines.append(f"    {variable} = {expression}")
+            return variable
+
+        # Stop at the first conjunct that is false, as And.evaluate does,
+        # or at the first disjunct that is true
+        if table:
+            header = "def evaluate(m, ones):"
+            if isinstance(sentence, And):
+                lines.append("    r = ones")
+                for conjunct in sentence.conjuncts:
+                    lines.append(f"    r &= {name(conjunct)}")
+                    lines.append("    if not r: return 0")
+            elif isinstance(sentence, Or):
+                lines.append("    r = 0")
+                for disjunct in sentence.disjuncts:
+                    lines.append(f"    r |= {name(disjunct)}")
+                    lines.append("    if r == ones: return r")
+            else:
+                lines.append(f"    r = {name(sentence)}")
+            lines.append("    return r")
+        else:
+            header = "def evaluate(m):"
+            if isinstance(sentence, And):
+                for conjunct in sentence.conjuncts:
+                    lines.append(f"    if not {name(conjunct)}: return False")
+                lines.append("    return True")
+            elif isinstance(sentence, Or):
+                for disjunct in sentence.disjuncts:
+                    lines.append(f"    if {name(disjunct)}: return True")
+                lines.append("    return False")
+            else:
+                lines.append(f"    return bool({name(sentence)})")
+        return header + "\n" + "\n".join(lines) + "\n"
+
+    @staticmethod
+    def define(source):
+        """Compiles generated source and returns the function it defines."""
+        namespace = dict()
+        exec(compile(source, "<sentence>", "exec"), namespace)
+        return namespace["evaluate"]
+
+    def model(self, model):
+        """Converts a model dictionary into a tuple for `evaluate`."""
+        return tuple(bool(model[name]) for name in self.symbols)
+
+
+def compile_sentence(sentence, symbols=None):
+    """Compiles a logical sentence for fast evaluation in many models."""
+    return CompiledSentence(sentence, symbols)
+
+
+def truth_table(sentence, symbols=None, chunk_size=16):
+    """
+    Yields the truth table of a logical sentence in chunks.
+
+    Model number m assigns symbols[i] the value of bit i of m. Each chunk
+    is a pair (offset, values) where bit b of the integer `values` is the
+    value of the sentence in model offset + b. Chunks cover 2**chunk_size
+    models, so memory stays bounded however many symbols there are.
+    """
+    compiled = compile_sentence(sentence, symbols)
+    n = len(compiled.symbols)
+    k = min(n, chunk_size)
+    size = 1 << k
+    ones = (1 << size) - 1
+
+    # Within a chunk, column i alternates runs of 2**i zeros and 2**i ones
+    columns = []
+    for i in range(k):
+        run = 1 << i
+        column = ((1 << run) - 1) << run
+        period = run << 1
+        while period < size:
+            column |= column << period
+            period <<= 1
+        columns.append(column)
+
+    # The remaining symbols are constant within a chunk
+    columns.extend([0] * (n - k))
+    for chunk in range(1 << (n - k)):
+        for i in range(k, n):
+            columns[i] = ones if chunk >> (i - k) & 1 else 0
+        yield chunk << k, compiled.evaluate_table(columns, ones)
+
+
+def count_models(sentence, symbols=None):
+    """
+    Returns the number of models, over the symbols of the sentence or the
+    given symbols, in which the logical sentence is true.
+    """
+    return sum(values.bit_count()
+               for _, values in truth_table(sentence, symbols))
+
+
+def table_check(knowledge, query):
+    """
+    Checks if knowledge base entails query by evaluating both over every
+    model, a chunk of models at a time.
+    """
+    for _, values in truth_table(And(knowledge, Not(query))):
+        if values:
+            return False
+    return True
+
+
+class CNF():
+    """
+    Tseitin encoding of logical sentences into clauses.
+
+    Each symbol and each compound subsentence is given an integer variable
+    v; the literal v means the variable is true, and -v means it is false.
+    Clauses are lists of literals, at least one of which must be true.
+    """
+
+    def __init__(self):
+        self.variables = dict()
+        self.definitions = dict()
+        self.clauses = []
+        self.num_variables = 0
+        self.true = None
+
+    def new_variable(self):
+        """Returns a fresh variable not used by any symbol or definition."""
+        self.num_variables += 1
+        return self.num_variables
+
+    def variable(self, name):
+        """Returns the variable representing the symbol `name`."""
+        try:
+            return self.variables[name]
+        except KeyError:
+            variable = self.variables[name] = self.new_variable()
+            return variable
+
+    def literal(self, sentence):
+        """
+        Returns a literal equivalent to `sentence`, adding the clauses that
+        define any new variables introduced for its subsentences.
+
+        Subsentences are encoded children first from an explicit stack
+        rather than by recursion, so deeply nested sentences do not hit
+        the recursion limit.
+        """
+        literals = dict()
+        stack = [sentence]
+        while stack:
+            node = stack[-1]
+            key = id(node)
+            if key in literals:
+                stack.pop()
+                continue
+
+            # Encode every shared subsentence object only once
+            if key in self.definitions:
+                literals[key] = self.definitions[key][1]
+                stack.pop()
+                continue
+            Sentence.validate(node)
+            pending = [child for child in node.children()
+                       if id(child) not in literals]
+            if pending:
+                stack.extend(reversed(pending))
+            else:
+                stack.pop()
+                literals[key] = self.define(node, literals)
+        return literals[id(sentence)]
+
+    def define(self, sentence, encoded):
+        """
+        Returns a literal equivalent to `sentence`, whose subsentences'
+        literals are already in `encoded` by id, adding the clauses that
+        define it if it needs a new variable.
+        """
+        if isinstance(sentence, Symbol):
+            return self.variable(sentence.name)
+        if isinstance(sentence, Not):
+            return -encoded[id(sentence.operand)]
+
+        if isinstance(sentence, (And, Or)):
+            if isinstance(sentence, And):
+                operands, sign = sentence.conjuncts, 1
+            else:
+                operands, sign = sentence.disjuncts, -1
+            literals = [sign * encoded[id(operand)] for operand in operands]
+            if not literals:
+                return sign * self.constant()
+            if len(literals) == 1:
+                return sign * literals[0]
+
+            # x <=> (l1 ∧ ... ∧ ln), negated throughout for disjunctions
+            x = self.new_variable()
+            for literal in literals:
+                self.clauses.append([-x, literal])
+            self.clauses.append([x] + [-literal for literal in literals])
+            literal = sign * x
+
+        elif isinstance(sentence, Implication):
+            a = encoded[id(sentence.antecedent)]
+            b = encoded[id(sentence.consequent)]
+            x = self.new_variable()
+            self.clauses.append([-x, -a, b])
+            self.clauses.append([x, a])
+            self.clauses.append([x, -b])
+            literal = x
+
+        elif isinstance(sentence, Biconditional):
+            a = encoded[id(sentence.left)]
+            b = encoded[id(sentence.right)]
+            x = self.new_variable()
+            self.clauses.append([-x, -a, b])
+            self.clauses.append([-x, a, -b])
+            self.clauses.append([x, a, b])
+            self.clauses.append([x, -a, -b])
+            literal = x
 
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+        else:
+            raise TypeError("must be a logical sentence")
 
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
+        self.definitions[id(sentence)] = (sentence, literal)
+        return literal
+
+    def constant(self):
+        """Returns a literal that is always true."""
+        if self.true is None:
+            self.true = self.new_variable()
+            self.clauses.append([self.true])
+        return self.true
+
+    def add(self, sentence):
+        """Adds clauses asserting that `sentence` is true."""
+        stack = [sentence]
+        while stack:
+            sentence = stack.pop()
+            if isinstance(sentence, And):
+                stack.extend(reversed(sentence.conjuncts))
+            elif isinstance(sentence, Or):
+                self.clauses.append(
+                    [self.literal(disjunct) for disjunct in sentence.disjuncts]
+                )
+            elif (isinstance(sentence, Not)
+                    and isinstance(sentence.operand, Not)):
+                stack.append(sentence.operand.operand)
+            elif (isinstance(sentence, Not)
+                    and isinstance(sentence.operand, Or)):
+                for disjunct in sentence.operand.disjuncts:
+                    self.clauses.append([-self.literal(disjunct)])
+            elif (isinstance(sentence, Not)
+                    and isinstance(sentence.operand, And)):
+                self.clauses.append(
+                    [-self.literal(conjunct)
+                     for conjunct in sentence.operand.conjuncts]
+                )
+            else:
+                self.clauses.append([self.literal(sentence)])
+
+
+class Solver():
+    """
+    Incremental CDCL satisfiability solver over CNF clauses.
+
+    Unit propagation watches two literals per clause, so assigning a
+    literal only visits the clauses watching its negation. Conflicts are
+    analyzed into learned clauses, which are kept across calls to `solve`;
+    clauses may be added between calls, and each call may assume extra
+    literals without adding them permanently.
+    """
+
+    def __init__(self):
+        self.value = dict()
+        self.level = dict()
+        self.reason = dict()
+        self.phase = dict()
+        self.activity = dict()
+        self.increment = 1.0
+        self.heap = []
+        self.watches = dict()
+        self.trail = []
+        self.levels = []
+        self.head = 0
+        self.model = dict()
+        self.inconsistent = False
+        self.conflicts = 0
+
+    def add_variable(self, variable):
+        """Makes `variable` known to the solver."""
+        if variable not in self.level:
+            self.value[variable] = self.value[-variable] = None
+            self.level[variable] = 0
+            self.reason[variable] = None
+            self.phase[variable] = False
+            self.activity[variable] = 0.0
+            self.watches[variable] = []
+            self.watches[-variable] = []
+            heapq.heappush(self.heap, (0.0, variable))
+
+    def add_clause(self, literals):
+        """Adds a clause, given as an iterable of literals."""
+        self.backtrack(0)
+        clause = []
+        for literal in literals:
+            self.add_variable(abs(literal))
+
+            # Drop literals already false, and clauses already true
+            value = self.value[literal]
+            if value or -literal in clause:
+                return
+            if value is None and literal not in clause:
+                clause.append(literal)
+
+        if not clause:
+            self.inconsistent = True
+        elif len(clause) == 1:
+            self.assign(clause[0], None)
+        else:
+            self.watches[clause[0]].append(clause)
+            self.watches[clause[1]].append(clause)
+
+    def assign(self, literal, reason):
+        """Makes `literal` true, as implied by `reason` or by a decision."""
+        variable = abs(literal)
+        self.value[literal] = True
+        self.value[-literal] = False
+        self.level[variable] = len(self.levels)
+        self.reason[variable] = reason
+        self.trail.append(literal)
+
+    def backtrack(self, level):
+        """Unassigns every literal above decision level `level`."""
+        if len(self.levels) <= level:
+            return
+        size = self.levels[level]
+        value = self.value
+        for literal in self.trail[size:]:
+            variable = abs(literal)
+            value[literal] = value[-literal] = None
+            self.phase[variable] = literal > 0
+            heapq.heappush(self.heap, (-self.activity[variable], variable))
+        del self.trail[size:]
+        del self.levels[level:]
+        self.head = min(self.head, size)
+
+    def propagate(self):
+        """
+        Assigns literals forced by unit clauses.
+        Returns a conflicting clause, or None if there is no conflict.
+        """
+        value = self.value
+        watches = self.watches
+        while self.head < len(self.trail):
+            false = -self.trail[self.head]
+            self.head += 1
+            watching = watches[false]
+            keep = []
+            for index, clause in enumerate(watching):
+
+                # Keep the literal that just became false in clause[1]
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                first = clause[0]
+                if value[first]:
+                    keep.append(clause)
+                    continue
+
+                # Look for another literal that is not false to watch
+                for k in range(2, len(clause)):
+                    if value[clause[k]] is not False:
+                        clause[1], clause[k] = clause[k], false
+                        watches[clause[1]].append(clause)
+                        break
+                else:
+                    keep.append(clause)
+                    if value[first] is False:
+                        keep.extend(watching[index + 1:])
+                        watches[false] = keep
+                        return clause
+                    self.assign(first, clause)
+            watches[false] = keep
+        return None
+
+    def analyze(self, conflict):
+        """
+        Derives a learned clause from a conflict at the current level.
+        Returns the clause, asserting literal first, and the level to
+        backtrack to so that it becomes unit.
+        """
+        level = self.level
+        current = len(self.levels)
+        seen = set()
+        learned = [None]
+        pending = 0
+        index = len(self.trail) - 1
+        literal = None
+        clause = conflict
+
+        # Resolve away literals of the current level until only one remains
+        while True:
+            for other in clause:
+                variable = abs(other)
+                if other == literal or variable in seen:
+                    continue
+                if level[variable] > 0:
+                    seen.add(variable)
+                    self.bump(variable)
+                    if level[variable] == current:
+                        pending += 1
+                    else:
+                        learned.append(other)
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            pending -= 1
+            if not pending:
+                break
+            clause = self.reason[abs(literal)]
+        learned[0] = -literal
+
+        # Watch the literal assigned last among the rest
+        if len(learned) == 1:
+            return learned, 0
+        deepest = max(range(1, len(learned)),
+                      key=lambda i: level[abs(learned[i])])
+        learned[1], learned[deepest] = learned[deepest], learned[1]
+        return learned, level[abs(learned[1])]
+
+    def bump(self, variable):
+        """Raises the priority of a variable involved in a conflict."""
+        activity = self.activity
+        activity[variable] += self.increment
+        if activity[variable] > 1e100:
+            for other in activity:
+                activity[other] *= 1e-100
+            self.increment *= 1e-100
+            self.heap = [(-activity[other], other) for other in activity
+                         if self.value[other] is None]
+            heapq.heapify(self.heap)
+        elif self.value[variable] is None:
+            heapq.heappush(self.heap, (-activity[variable], variable))
+
+    def choose(self):
+        """Returns an unassigned literal to branch on, or None."""
+        heap = self.heap
+        while heap:
+            priority, variable = heapq.heappop(heap)
+            if (self.value[variable] is None
+                    and -priority == self.activity[variable]):
+                return variable if self.phase[variable] else -variable
+        return None
+
+    def solve(self, assumptions=()):
+        """
+        Returns True if the clauses, together with the assumed literals,
+        are satisfiable, leaving a satisfying assignment of every variable
+        in self.model; returns False otherwise.
+        """
+        self.backtrack(0)
+        if self.inconsistent:
+            return False
+        assumptions = list(assumptions)
+        for literal in assumptions:
+            self.add_variable(abs(literal))
+
+        restart = 100
+        conflicts = 0
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if not self.levels:
+                    self.inconsistent = True
+                    return False
+                self.conflicts += 1
+                conflicts += 1
+                learned, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learned) == 1:
+                    self.assign(learned[0], None)
+                else:
+                    self.watches[learned[0]].append(learned)
+                    self.watches[learned[1]].append(learned)
+                    self.assign(learned[0], learned)
+                self.increment /= 0.95
+                continue
+
+            # Restart now and then, keeping learned clauses and phases
+            if conflicts >= restart:
+                conflicts = 0
+                restart = int(restart * 1.5)
+                self.backtrack(0)
+                continue
+
+            # Assumptions are decided first, one per decision level
+            if len(self.levels) < len(assumptions):
+                literal = assumptions[len(self.levels)]
+                if self.value[literal] is False:
+                    self.backtrack(0)
+                    return False
+                self.levels.append(len(self.trail))
+                if self.value[literal] is None:
+                    self.assign(literal, None)
+                continue
+
+            literal = self.choose()
+            if literal is None:
+                self.model = {
+                    variable: self.value[variable] for variable in self.level
+                }
+                self.backtrack(0)
+                return True
+            self.levels.append(len(self.trail))
+            self.assign(literal, None)
+
+
+class KnowledgeBase():
+    """
+    Knowledge base answering many queries with one incremental solver.
+
+    Sentences can be added at any time. Each query is asked as an
+    assumption rather than added, so clauses learned while answering one
+    query are kept for the next.
+    """
+
+    def __init__(self, *sentences):
+        self.cnf = CNF()
+        self.solver = Solver()
+        for sentence in sentences:
+            self.add(sentence)
+
+    def add(self, sentence):
+        """Adds a logical sentence to the knowledge base."""
+        self.cnf.add(sentence)
+        self.flush()
+
+    def flush(self):
+        """Moves newly encoded clauses into the solver."""
+        for clause in self.cnf.clauses:
+            self.solver.add_clause(clause)
+        self.cnf.clauses.clear()
+
+    def literal(self, sentence):
+        """Returns the solver literal equivalent to `sentence`."""
+        literal = self.cnf.literal(sentence)
+        self.flush()
+        self.solver.add_variable(abs(literal))
+        return literal
+
+    def satisfiable(self, *assumptions):
+        """
+        Checks if there is a model of the knowledge base in which every
+        assumed sentence is also true.
+        """
+        literals = [self.literal(sentence) for sentence in assumptions]
+        return self.solver.solve(literals)
+
+    def entails(self, query):
+        """Checks if the knowledge base entails the query."""
+        return not self.solver.solve([-self.literal(query)])
+
+    def entailed(self, queries):
+        """
+        Returns the list of queries that the knowledge base entails.
+
+        Every model found rules out all queries false in it, so most queries
+        are settled without a solve of their own.
+        """
+        queries = list(queries)
+        literals = [self.literal(query) for query in queries]
+        if not self.solver.solve():
+            return queries
+
+        def possible(literal):
+            """Checks if `literal` holds in the last model found."""
+            value = self.solver.model[abs(literal)]
+            return value if literal > 0 else not value
+
+        candidates = [i for i in range(len(queries))
+                      if possible(literals[i])]
+        entailed = set()
+        while candidates:
+            i = candidates.pop()
+            if self.solver.solve([-literals[i]]):
+                candidates = [j for j in candidates if possible(literals[j])]
+            else:
+                entailed.add(i)
+        return [query for i, query in enumerate(queries) if i in entailed]
+
+
+def satisfiable(sentence):
+    """Checks if there is a model in which the logical sentence is true."""
+    return KnowledgeBase(sentence).satisfiable()
 
-        # If model has an assignment for each symbol
-        if not symbols:
 
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
-        else:
+def model_check(knowledge, query):
+    """Checks if knowledge base entails query."""
 
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
+    # Knowledge entails query exactly when no model of the knowledge base
+    # makes the query false
+    return KnowledgeBase(knowledge).entails(query)
 
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
 
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
+def enumerate_check(knowledge, query, counters=None):
+    """
+    Checks if knowledge base entails query by enumerating models.
 
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+    Partial models are evaluated three-valued, so a branch is cut as soon
+    as the knowledge base is false or the query is true in all of its
+    completions. Symbols occurring most often are assigned first. If given,
+    `counters` is a dict whose "nodes" and "pruned" entries are increased
+    by the number of partial models visited and branches cut.
+    """
+    if counters is None:
+        counters = dict()
+    counters.setdefault("nodes", 0)
+    counters.setdefault("pruned", 0)
 
-    # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
+    def check_all(knowledge, query, symbols, model):
+        """Checks if knowledge base entails query, given a partial model."""
+        counters["nodes"] += 1
+
+        # If knowledge base is false or query true, entailment holds here;
+        # if knowledge base is true and query false, it fails. Once every
+        # symbol is assigned, one of these is always the case
+        known = knowledge.evaluate_partial(model)
+        value = True if known is False else query.evaluate_partial(model)
+        if value is not None and (known is not None or value is True):
+            if len(model) < len(symbols):
+                counters["pruned"] += 1
+            return value
+
+        # Choose the next symbol and ensure entailment holds both ways
+        p = symbols[len(model)]
+        for assignment in (True, False):
+            model[p] = assignment
+            entailed = check_all(knowledge, query, symbols, model)
+            del model[p]
+            if not entailed:
+                return False
+        return True
+
+    # Order symbols by how often they occur in knowledge and query
+    occurrences = dict()
+    stack = [knowledge, query]
+    while stack:
+        sentence = stack.pop()
+        if isinstance(sentence, Symbol):
+            occurrences[sentence.name] = occurrences.get(sentence.name, 0) + 1
+        else:
+            stack.extend(sentence.children())
+    symbols = sorted(occurrences, key=lambda name: (-occurrences[name], name))
 
     # Check that knowledge entails query
     return check_all(knowledge, query, symbols, dict())
@@ -1,5 +1,8 @@
+import collections
 import itertools
+import math
 import random
+import time
 
 
 class Minesweeper():
@@ -12,23 +15,22 @@ class Minesweeper():
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
 
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        # Initialize an empty field with no mines, one byte per cell,
+        # with cell (i, j) at index i * width + j
+        self.board = bytearray(height * width)
 
         # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        positions = random.sample(range(height * width), mines)
+        for position in positions:
+            self.board[position] = 1
+        self.mines = {divmod(position, width) for position in positions}
+
+        # Number of mines next to each cell, in the same layout
+        self.counts = neighbor_counts(self.board, height, width)
+
+        # Cells revealed so far, in the same layout
+        self.revealed = bytearray(height * width)
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -41,7 +43,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.board[i * self.width + j]:
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -50,7 +52,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return self.board[i * self.width + j] == 1
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +60,44 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
+        i, j = cell
+        return self.counts[i * self.width + j]
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+    def reveal(self, cell, flags=()):
+        """
+        Reveals a safe cell and, if no mines are near it, every cell
+        around it, continuing outward through all connected cells with no
+        nearby mines. Cells in `flags` are left hidden and not continued
+        through. Returns a list of (cell, nearby mines) pairs for the
+        cells newly revealed.
+        """
+        if self.is_mine(cell):
+            raise ValueError(f"cell {cell} is a mine")
+        i, j = cell
+        position = i * self.width + j
+        if self.revealed[position]:
+            return []
+
+        # Breadth-first search outward from the cell
+        flagged = {x * self.width + y for x, y in flags}
+        self.revealed[position] = 1
+        queue = collections.deque([position])
+        cells = []
+        while queue:
+            position = queue.popleft()
+            i, j = divmod(position, self.width)
+            count = self.counts[position]
+            cells.append(((i, j), count))
+            if count:
+                continue
+            for x in range(max(0, i - 1), min(i + 2, self.height)):
+                for y in range(max(0, j - 1), min(j + 2, self.width)):
+                    neighbor = x * self.width + y
+                    if (not self.revealed[neighbor]
+                            and neighbor not in flagged):
+                        self.revealed[neighbor] = 1
+                        queue.append(neighbor)
+        return cells
 
     def won(self):
         """
@@ -84,29 +106,163 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+def neighbor_counts(board, height, width):
+    """
+    Returns a bytearray with the number of mines next to each cell of a
+    board laid out as in Minesweeper.board.
+
+    The board is padded with a border of empty cells and read as one big
+    integer with a byte per cell. Adding copies shifted by one cell and
+    then by one padded row sums every 3x3 window at once, and no byte can
+    carry into the next as a window holds at most 9 mines.
+    """
+    padded_width = width + 2
+    padded = bytearray((height + 2) * padded_width)
+    for i in range(height):
+        start = (i + 1) * padded_width + 1
+        padded[start:start + width] = board[i * width:(i + 1) * width]
+
+    cells = int.from_bytes(padded, "little")
+    rows = cells + (cells << 8) + (cells >> 8)
+    row = 8 * padded_width
+    windows = rows + (rows << row) + (rows >> row) - cells
+    windows = windows.to_bytes(len(padded) + padded_width + 1, "little")
+
+    counts = bytearray(height * width)
+    for i in range(height):
+        start = (i + 1) * padded_width + 1
+        counts[i * width:(i + 1) * width] = windows[start:start + width]
+    return counts
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+
+    Cells are stored as bits of an integer rather than as a set: cell
+    (i, j) is bit i * width + j - offset of self.bits, where offset is
+    the position of the sentence's first cell. Sentences about nearby
+    cells stay small integers even on huge boards, and subset tests and
+    differences are a few integer operations.
+
+    The width of the board defaults to one more than the largest column
+    of the cells. Sentences of different widths still compare correctly,
+    but only sentences of the same width use the integer operations.
     """
 
-    def __init__(self, cells, count):
-        self.cells = set(cells)
+    __slots__ = ("width", "count", "offset", "bits", "size")
+
+    def __init__(self, cells, count, width=None):
+        cells = list(cells)
+        if width is None:
+            width = max((j for _, j in cells), default=0) + 1
+        self.width = width
         self.count = count
+        positions = []
+        for i, j in cells:
+            if not 0 <= j < width:
+                raise ValueError(f"cell {(i, j)} is outside width {width}")
+            positions.append(i * width + j)
+        self.offset = min(positions, default=0)
+        self.bits = 0
+        for position in positions:
+            self.bits |= 1 << (position - self.offset)
+        self.size = self.bits.bit_count()
+
+    @classmethod
+    def from_bits(cls, bits, offset, count, width):
+        """
+        Returns the sentence whose cells are the set bits of `bits`,
+        shifted by `offset`, on a board of the given width.
+        """
+        sentence = cls.__new__(cls)
+        sentence.width = width
+        sentence.count = count
+        sentence.offset = offset
+        sentence.bits = bits
+        sentence.size = bits.bit_count()
+        sentence.normalize()
+        return sentence
+
+    def normalize(self):
+        """Shifts self.bits so that its lowest set bit is bit 0."""
+        if not self.bits:
+            self.offset = 0
+        elif not self.bits & 1:
+            shift = (self.bits & -self.bits).bit_length() - 1
+            self.bits >>= shift
+            self.offset += shift
+
+    @property
+    def cells(self):
+        """The set of board cells in the sentence."""
+        return {divmod(position, self.width) for position in self.positions()}
+
+    def positions(self):
+        """
+        Returns the list of board positions i * width + j of the cells
+        in the sentence.
+        """
+        positions = []
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            positions.append(self.offset + lowest.bit_length() - 1)
+            bits ^= lowest
+        return positions
+
+    def __len__(self):
+        return self.size
 
     def __eq__(self, other):
-        return self.cells == other.cells and self.count == other.count
+        if self.width != other.width:
+            return self.cells == other.cells and self.count == other.count
+        return (self.bits == other.bits and self.offset == other.offset
+                and self.count == other.count)
 
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
+    def key(self):
+        """
+        Returns a hashable key that is equal for two sentences on the same
+        board exactly when the sentences are equal.
+        """
+        return (self.offset, self.bits, self.count)
+
+    def issubset(self, other):
+        """
+        Checks if every cell of this sentence is also a cell of `other`.
+        """
+        if self.width != other.width:
+            return self.cells <= other.cells
+        shift = self.offset - other.offset
+        if shift < 0:
+            return not self.bits
+        bits = self.bits << shift
+        return bits & other.bits == bits
+
+    def difference(self, other):
+        """
+        Returns the sentence about the cells of this sentence that are not
+        in `other`, a subset of it, and the mines among them.
+        """
+        if self.width != other.width:
+            return Sentence(self.cells - other.cells,
+                            self.count - other.count, self.width)
+        bits = self.bits & ~(other.bits << (other.offset - self.offset))
+        return Sentence.from_bits(
+            bits, self.offset, self.count - other.count, self.width
+        )
+
     def known_mines(self):
         """
         Returns the set of all cells in self.cells known to be mines.
         """
-        if len(self.cells) == self.count:
-            return set(self.cells)
+        if self.size == self.count:
+            return self.cells
         return set()
 
     def known_safes(self):
@@ -114,17 +270,30 @@ class Sentence():
         Returns the set of all cells in self.cells known to be safe.
         """
         if self.count == 0:
-            return set(self.cells)
+            return self.cells
         return set()
 
+    def remove(self, cell):
+        """
+        Removes a cell from the sentence, returning whether it was there.
+        """
+        i, j = cell
+        position = i * self.width + j - self.offset
+        if not 0 <= j < self.width or position < 0:
+            return False
+        if not self.bits >> position & 1:
+            return False
+        self.bits ^= 1 << position
+        self.size -= 1
+        self.normalize()
+        return True
 
     def mark_mine(self, cell):
         """
         Updates internal knowledge representation given the fact that
         a cell is known to be a mine.
         """
-        if cell in self.cells:
-            self.cells.remove(cell)
+        if self.remove(cell):
             self.count -= 1
             return 1
         return 0
@@ -134,23 +303,53 @@ class Sentence():
         Updates internal knowledge representation given the fact that
         a cell is known to be safe.
         """
-        if cell in self.cells:
-            self.cells.remove(cell)
+        if self.remove(cell):
             return 1
         return 0
 
 
+def convolve(a, b):
+    """
+    Returns the product of two polynomials given as dictionaries from
+    exponent to coefficient: here, from a number of mines to the number
+    of ways to place that many.
+    """
+    product = dict()
+    for i, x in a.items():
+        for j, y in b.items():
+            product[i + j] = product.get(i + j, 0) + x * y
+    return product
+
+
 class MinesweeperAI():
     """
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    # Counters kept in self.metrics when metrics are enabled
+    COUNTERS = ("batches", "cells", "rounds", "compared", "inferred",
+                "update_time", "inference_time")
+
+    def __init__(self, height=8, width=8, mines=None, metrics=False):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Total number of mines on the board, if known
+        self.total_mines = mines
+
+        # Fraction of unknown cells assumed to be mines
+        # when the total number of mines is not known
+        self.density = 0.16
+
+        # Limits on the work make_random_move does to weigh its guess:
+        # seconds per move, partial placements counted per group of
+        # sentences before sampling placements instead, and samples
+        self.time_budget = 0.05
+        self.max_states = 20000
+        self.max_samples = 200
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
@@ -158,8 +357,57 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Sentences about the game known to be true, keyed by
+        # sentence.key() so that no two are equal
+        self.knowledge = dict()
+
+        # Sentences mentioning the cell at each board position
+        # i * width + j, keyed by id(sentence)
+        self.containing = dict()
+
+        # Sentences changed since they were last checked for known cells,
+        # and since they were last compared with other sentences
+        self.unchecked = dict()
+        self.uncompared = dict()
+
+        # If metrics are enabled, totals of the work done adding knowledge
+        # for each counter in COUNTERS, the current size of the knowledge
+        # base, and a trace with the same counters for each batch
+        self.metrics = None
+        if metrics:
+            self.metrics = dict.fromkeys(self.COUNTERS, 0)
+            self.metrics["knowledge"] = 0
+            self.metrics["trace"] = []
+
+    def touch(self, sentence):
+        """
+        Queues a new or changed sentence to be checked for known cells and
+        compared with the sentences it shares cells with.
+        """
+        self.unchecked[id(sentence)] = sentence
+        self.uncompared[id(sentence)] = sentence
+
+    def discard(self, sentence):
+        """
+        Removes a sentence that is no longer in the knowledge base from
+        the cell index and the worklists.
+        """
+        for position in sentence.positions():
+            del self.containing[position][id(sentence)]
+        self.unchecked.pop(id(sentence), None)
+        self.uncompared.pop(id(sentence), None)
+
+    def rekey(self, sentence):
+        """
+        Files a sentence that has just lost a cell under its new key,
+        dropping it if it is now empty or equal to another sentence.
+        """
+        key = sentence.key()
+        if not sentence.bits or key in self.knowledge:
+            self.discard(sentence)
+        else:
+            self.knowledge[key] = sentence
+            self.touch(sentence)
 
     def mark_mine(self, cell):
         """
@@ -168,8 +416,11 @@ class MinesweeperAI():
         """
         counter = 0
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        i, j = cell
+        for sentence in self.containing.pop(i * self.width + j, {}).values():
+            del self.knowledge[sentence.key()]
             counter += sentence.mark_mine(cell)
+            self.rekey(sentence)
         return counter
 
     def mark_safe(self, cell):
@@ -179,10 +430,32 @@ class MinesweeperAI():
         """
         counter = 0
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        i, j = cell
+        for sentence in self.containing.pop(i * self.width + j, {}).values():
+            del self.knowledge[sentence.key()]
             counter += sentence.mark_safe(cell)
+            self.rekey(sentence)
         return counter
 
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base, leaving out cells
+        already known to be safe or mines.
+        """
+        for cell in sentence.cells:
+            if cell in self.mines:
+                sentence.mark_mine(cell)
+            elif cell in self.safes:
+                sentence.mark_safe(cell)
+        key = sentence.key()
+        if not sentence.bits or key in self.knowledge:
+            return
+        self.knowledge[key] = sentence
+        for position in sentence.positions():
+            containing = self.containing.setdefault(position, dict())
+            containing[id(sentence)] = sentence
+        self.touch(sentence)
+
     def add_knowledge(self, cell, count):
         """
         Called when the Minesweeper board tells us, for a given
@@ -198,23 +471,40 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
-        # mark the cell as a move that has been made
-        self.moves_made.add(cell)
+        self.add_knowledge_batch([(cell, count)])
 
-        # mark the cell as safe
-        self.mark_safe(cell)
+    def add_knowledge_batch(self, revealed):
+        """
+        Called with a list of (cell, count) pairs, such as those returned
+        by Minesweeper.reveal, to add knowledge about every cell as in
+        add_knowledge but draw inferences only once for all of them.
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            before = {name: metrics[name] for name in self.COUNTERS}
+            metrics["batches"] += 1
+            metrics["cells"] += len(revealed)
 
-        neighbors = set()
-        i, j = cell
+        for cell, _ in revealed:
 
-        for x in range(max(0, i-1), min(i+2, self.height)):
-            for y in range(max(0, j-1), min(j+2, self.width)):
-                if (x, y) != (i, j):
-                    neighbors.add((x, y))
+            # mark the cell as a move that has been made
+            self.moves_made.add(cell)
 
-        # add a new sentence to the AI's knowledge base
-        # based on the value of `cell` and `count`
-        self.knowledge.append(Sentence(neighbors, count))
+            # mark the cell as safe
+            self.mark_safe(cell)
+
+        for cell, count in revealed:
+            neighbors = set()
+            i, j = cell
+
+            for x in range(max(0, i-1), min(i+2, self.height)):
+                for y in range(max(0, j-1), min(j+2, self.width)):
+                    if (x, y) != (i, j):
+                        neighbors.add((x, y))
+
+            # add a new sentence to the AI's knowledge base
+            # based on the value of `cell` and `count`
+            self.add_sentence(Sentence(neighbors, count, self.width))
 
         # mark any additional cells as safe or as mines
         # if it can be concluded based on the AI's knowledge base
@@ -223,59 +513,80 @@ class MinesweeperAI():
         # add any new sentences to the AI's knowledge base
         # if they can be inferred from existing knowledge
         new_inferences = self.get_new_inferences()
+        rounds = 0
+        inferred = 0
         while new_inferences:
+            rounds += 1
+            inferred += len(new_inferences)
             for sentence in new_inferences:
-                self.knowledge.append(sentence)
+                self.add_sentence(sentence)
 
             self.update_safes_and_mines()
             new_inferences = self.get_new_inferences()
 
+        if metrics is not None:
+            metrics["rounds"] += rounds
+            metrics["inferred"] += inferred
+            metrics["knowledge"] = len(self.knowledge)
+            batch = {name: metrics[name] - before[name]
+                     for name in self.COUNTERS if name != "batches"}
+            batch["knowledge"] = len(self.knowledge)
+            metrics["trace"].append(batch)
+
     def update_safes_and_mines(self):
-        # repeat update if an update was made in the previous cycle
-        counter = 1
-        while counter:
-            counter = 0
-            for sentence in self.knowledge:
-                for cell in sentence.known_safes():
-                    self.mark_safe(cell)
-                    counter += 1
-                for cell in sentence.known_mines():
-                    self.mark_mine(cell)
-                    counter += 1
-            for cell in self.safes:
-                counter += self.mark_safe(cell)
-            for cell in self.mines:
-                counter += self.mark_mine(cell)
+        if self.metrics is not None:
+            start = time.perf_counter()
 
-    def get_new_inferences(self):
-        new_inferences = []
-        sentences_to_remove = []
-
-        # for each sentence known
-        for set_1 in self.knowledge:
-            # all cells removed from the sentence
-            if not set_1.cells:
-                sentences_to_remove.append(set_1)
-                continue
+        # only sentences changed since the last check can have
+        # new known cells; marking cells queues the sentences it changes
+        while self.unchecked:
+            _, sentence = self.unchecked.popitem()
+            for cell in sentence.known_safes():
+                self.mark_safe(cell)
+            for cell in sentence.known_mines():
+                self.mark_mine(cell)
 
-            for set_2 in self.knowledge:
-                # all cells removed from the sentence
-                if not set_2.cells:
-                    sentences_to_remove.append(set_2)
+        if self.metrics is not None:
+            self.metrics["update_time"] += time.perf_counter() - start
+
+    def get_new_inferences(self):
+        if self.metrics is not None:
+            start = time.perf_counter()
+        compared = 0
+        new_inferences = dict()
+        uncompared = list(self.uncompared.values())
+        self.uncompared.clear()
+
+        # compare each changed sentence with the sentences sharing a cell
+        # with it, the only ones it can be a subset or superset of
+        for set_1 in uncompared:
+            neighbors = dict()
+            for position in set_1.positions():
+                neighbors.update(self.containing[position])
+            compared += len(neighbors) - 1
+
+            for set_2 in neighbors.values():
+                if set_2 is set_1:
                     continue
 
-                if set_1 != set_2:
-                    # check if subset, if yes, set2 - set1 = count2 - count1
-                    if set_2.cells.issubset(set_1.cells):
-                        diff_cells = set_1.cells.difference(set_2.cells)
-                        diff_count = set_1.count - set_2.count
+                # check if subset, if yes, set2 - set1 = count2 - count1
+                # (Sentence.issubset, inlined as this is the hot loop)
+                for subset, superset in ((set_1, set_2), (set_2, set_1)):
+                    shift = subset.offset - superset.offset
+                    if shift < 0 or subset.size >= superset.size:
+                        continue
+                    bits = subset.bits << shift
+                    if bits & superset.bits == bits:
                         # an inference can be drawn
-                        new_inference_to_add = Sentence(diff_cells, diff_count)
-                        if new_inference_to_add not in self.knowledge:
-                            new_inferences.append(new_inference_to_add)
+                        new_inference_to_add = superset.difference(subset)
+                        key = new_inference_to_add.key()
+                        if key not in self.knowledge:
+                            new_inferences[key] = new_inference_to_add
 
-        self.knowledge = [x for x in self.knowledge if x not in sentences_to_remove]
-        return new_inferences
+        if self.metrics is not None:
+            self.metrics["compared"] += compared
+            self.metrics["inference_time"] += time.perf_counter() - start
+        return list(new_inferences.values())
 
     def make_safe_move(self):
         """
@@ -294,13 +605,298 @@ class MinesweeperAI():
     def make_random_move(self):
         """
         Returns a move to make on the Minesweeper board.
-        Should choose randomly among cells that:
+        Should choose among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+        picking randomly among those least likely to be a mine.
         """
-        for i in range(self.height):
-            for j in range(self.width):
-                move = (i, j)
-                if move not in self.moves_made and move not in self.mines:
-                    return move
-        return None
\ No newline at end of file
+        probabilities = self.mine_probabilities()
+        if not probabilities:
+            return None
+        lowest = min(probabilities.values())
+        return random.choice(sorted(
+            cell for cell, probability in probabilities.items()
+            if probability <= lowest + 1e-9
+        ))
+
+    def mine_probabilities(self):
+        """
+        Returns a dictionary from each cell that has not been chosen and
+        is not known to be a mine to the probability that it is one,
+        given the knowledge base and, if known, the number of mines.
+        """
+        deadline = time.perf_counter() + self.time_budget
+        cells = set(itertools.product(range(self.height), range(self.width)))
+        cells -= self.moves_made | self.mines
+        probabilities = {cell: 0.0 for cell in cells & self.safes}
+
+        # Count placements for each group of sentences, smallest first;
+        # a group too large to count exactly is sampled instead, and
+        # one where sampling finds nothing is treated as unconstrained
+        groups = sorted(self.components(), key=len)
+        solved = []
+        for n, group in enumerate(groups):
+            result = self.count_solutions(group, deadline)
+            if result is None:
+                now = time.perf_counter()
+                share = max(deadline - now, 0) / (len(groups) - n)
+                result = self.sample_solutions(group, now + share)
+            if result is not None:
+                solved.append(result)
+        frontier = {position for _, mines in solved for position in mines}
+        unconstrained = [
+            cell for cell in cells - self.safes
+            if cell[0] * self.width + cell[1] not in frontier
+        ]
+
+        # Weight each number of mines on the frontier by the number of
+        # ways to place the remaining mines among unconstrained cells
+        left = None
+        if self.total_mines is not None:
+            left = self.total_mines - len(self.mines)
+            totals = {0: 1}
+            for counts, _ in solved:
+                totals = convolve(totals, counts)
+            total = sum(x * self.weight(k, left, len(unconstrained))
+                        for k, x in totals.items())
+            if total == 0:
+                left = None
+
+        if left is None:
+
+            # Without a usable mine count, treat each unknown cell as a
+            # mine with the prior density, independently of the others
+            ratio = self.density / (1 - self.density)
+            for counts, mines in solved:
+                total = sum(x * ratio ** k for k, x in counts.items())
+                for position, with_mine in mines.items():
+                    probabilities[divmod(position, self.width)] = sum(
+                        x * ratio ** k for k, x in with_mine.items()
+                    ) / total
+            for cell in unconstrained:
+                probabilities[cell] = self.density
+            return probabilities
+
+        # A cell's probability sums its group's placements with it as a
+        # mine, each weighted by the ways to complete them elsewhere
+        prefixes = [{0: 1}]
+        for counts, _ in solved:
+            prefixes.append(convolve(prefixes[-1], counts))
+        suffix = {0: 1}
+        for n in reversed(range(len(solved))):
+            counts, mines = solved[n]
+            others = convolve(prefixes[n], suffix)
+            completions = {
+                k: sum(x * self.weight(k + j, left, len(unconstrained))
+                       for j, x in others.items())
+                for k in range(max(counts) + 1)
+            }
+            for position, with_mine in mines.items():
+                probabilities[divmod(position, self.width)] = sum(
+                    x * completions[k] for k, x in with_mine.items()
+                ) / total
+            suffix = convolve(suffix, counts)
+        if unconstrained:
+            expected = sum(
+                x * self.weight(k, left, len(unconstrained)) * (left - k)
+                for k, x in totals.items()
+            ) / total
+            for cell in unconstrained:
+                probabilities[cell] = expected / len(unconstrained)
+        return probabilities
+
+    @staticmethod
+    def weight(frontier, left, unconstrained):
+        """
+        Returns the number of ways to place the mines that are not on the
+        frontier among the unconstrained cells.
+        """
+        if frontier > left:
+            return 0
+        return math.comb(unconstrained, left - frontier)
+
+    def components(self):
+        """
+        Splits the knowledge base into groups of sentences such that no
+        two groups share a cell, returning each group as a list.
+        """
+        parent = dict()
+
+        def find(position):
+            root = position
+            while parent[root] != root:
+                root = parent[root]
+            while parent[position] != root:
+                parent[position], position = root, parent[position]
+            return root
+
+        for sentence in self.knowledge.values():
+            positions = sentence.positions()
+            for position in positions:
+                parent.setdefault(position, position)
+            first = find(positions[0])
+            for position in positions[1:]:
+                parent[find(position)] = first
+
+        groups = dict()
+        for sentence in self.knowledge.values():
+            groups.setdefault(find(sentence.offset), []).append(sentence)
+        return list(groups.values())
+
+    def constraints(self, sentences):
+        """
+        Orders the cells of a group of sentences breadth first, so that
+        cells sharing sentences are close together. Returns the order,
+        the counts of the sentences, and for each cell the indices of its
+        sentences paired with how many of their cells come after it.
+        """
+        positions = {id(sentence): sentence.positions()
+                     for sentence in sentences}
+        order = [positions[id(sentences[0])][0]]
+        seen = set(order)
+        for position in order:
+            for sentence in self.containing[position].values():
+                for other in positions[id(sentence)]:
+                    if other not in seen:
+                        seen.add(other)
+                        order.append(other)
+
+        index = {position: i for i, position in enumerate(order)}
+        steps = [[] for _ in order]
+        for c, sentence in enumerate(sentences):
+            indices = sorted(index[position]
+                             for position in positions[id(sentence)])
+            for remaining, i in enumerate(reversed(indices)):
+                steps[i].append((c, remaining))
+        counts = tuple(sentence.count for sentence in sentences)
+        return order, counts, steps
+
+    @staticmethod
+    def advance(state, step, mine):
+        """
+        Returns the number of mines each sentence still needs after the
+        next cell is assigned, or None if a sentence can no longer be met.
+        """
+        state = list(state)
+        for c, remaining in step:
+            state[c] -= mine
+            if not 0 <= state[c] <= remaining:
+                return None
+        return tuple(state)
+
+    def count_solutions(self, sentences, deadline):
+        """
+        Counts the mine placements consistent with a group of sentences.
+
+        Returns a pair: a dictionary from a number of mines to the number
+        of placements with that many, and a dictionary from each cell's
+        board position to the same counts over placements where that cell
+        is a mine. Cells are assigned one at a time, and partial placements
+        that leave every sentence needing the same number of mines are
+        merged, so the work grows with the number of sentences open at
+        once rather than with the number of placements. Returns None if
+        the work passes self.max_states or `deadline`.
+        """
+        order, initial, steps = self.constraints(sentences)
+
+        # Forward: ways to reach each state after each cell, by mines
+        layers = [{initial: {0: 1}}]
+        states = 0
+        for step in steps:
+            layer = dict()
+            for state, ways in layers[-1].items():
+                for mine in (0, 1):
+                    following = self.advance(state, step, mine)
+                    if following is None:
+                        continue
+                    target = layer.setdefault(following, dict())
+                    for k, x in ways.items():
+                        target[k + mine] = target.get(k + mine, 0) + x
+            states += len(layer)
+            if states > self.max_states or time.perf_counter() > deadline:
+                return None
+            layers.append(layer)
+
+        # Backward: ways to finish from each state and, for each cell,
+        # the ways to reach it times the ways to finish with it a mine
+        after = {state: {0: 1} for state in layers[-1]}
+        mines = dict()
+        for i in reversed(range(len(order))):
+            before = dict()
+            with_mine = dict()
+            for state, ways in layers[i].items():
+                finishes = dict()
+                for mine in (0, 1):
+                    following = self.advance(state, steps[i], mine)
+                    rest = after.get(following)
+                    if rest is None:
+                        continue
+                    for k, x in rest.items():
+                        finishes[k + mine] = finishes.get(k + mine, 0) + x
+                    if mine:
+                        for k, x in convolve(ways, rest).items():
+                            with_mine[k + 1] = with_mine.get(k + 1, 0) + x
+                if finishes:
+                    before[state] = finishes
+            mines[order[i]] = with_mine
+            after = before
+        if initial not in after:
+            return None
+        return after[initial], mines
+
+    def sample_solutions(self, sentences, deadline):
+        """
+        Finds mine placements consistent with a group of sentences by
+        randomized depth-first search, until it has self.max_samples of
+        them, has made ten searches for each of those, or `deadline`
+        passes. Returns the same counts as count_solutions over the
+        distinct placements found, or None if it finds none.
+        """
+        order, initial, steps = self.constraints(sentences)
+        found = set()
+        searches = 0
+        while (len(found) < self.max_samples
+               and searches < 10 * self.max_samples
+               and time.perf_counter() < deadline):
+            searches += 1
+            stack = [(initial, self.options())]
+            values = []
+            tries = 0
+            while stack and tries < 20 * len(order):
+                tries += 1
+                state, options = stack[-1]
+                if len(values) == len(stack):
+                    values.pop()
+                if not options:
+                    stack.pop()
+                    continue
+                mine = options.pop()
+                following = self.advance(state, steps[len(values)], mine)
+                if following is None:
+                    continue
+                values.append(mine)
+                if len(values) == len(order):
+                    found.add(tuple(values))
+                    break
+                stack.append((following, self.options()))
+        if not found:
+            return None
+
+        counts = dict()
+        mines = {position: dict() for position in order}
+        for values in found:
+            k = sum(values)
+            counts[k] = counts.get(k, 0) + 1
+            for position, mine in zip(order, values):
+                if mine:
+                    mines[position][k] = mines[position].get(k, 0) + 1
+        return counts, mines
+
+    def options(self):
+        """
+        Returns the values sample_solutions should try for a cell, in
+        reverse order: a mine first with the prior density.
+        """
+        if random.random() < self.density:
+            return [0, 1]
+        return [1, 0]
\ No newline at end of file
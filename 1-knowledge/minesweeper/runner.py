@@ -1,6 +1,5 @@
 import pygame
 import sys
-import time
 
 from minesweeper import Minesweeper, MinesweeperAI
 
@@ -8,6 +7,9 @@ HEIGHT = 8
 WIDTH = 8
 MINES = 8
 
+# Most frames to draw per second
+FPS = 60
+
 # Colors
 BLACK = (0, 0, 0)
 GRAY = (180, 180, 180)
@@ -17,6 +19,7 @@ WHITE = (255, 255, 255)
 pygame.init()
 size = width, height = 600, 400
 screen = pygame.display.set_mode(size)
+clock = pygame.time.Clock()
 
 # Fonts
 OPEN_SANS = "assets/fonts/OpenSans-Regular.ttf"
@@ -37,9 +40,160 @@ flag = pygame.transform.scale(flag, (cell_size, cell_size))
 mine = pygame.image.load("assets/images/mine.png")
 mine = pygame.transform.scale(mine, (cell_size, cell_size))
 
+
+def cell_surface(glyph=None):
+    """
+    Returns a surface with a board cell drawn on it,
+    and `glyph` centered on the cell if given.
+    """
+    surface = pygame.Surface((cell_size, cell_size))
+    rect = surface.get_rect()
+    pygame.draw.rect(surface, GRAY, rect)
+    pygame.draw.rect(surface, WHITE, rect, 3)
+    if glyph is not None:
+        glyphRect = glyph.get_rect()
+        glyphRect.center = rect.center
+        surface.blit(glyph, glyphRect)
+    return surface
+
+
+# Render every kind of cell once, to be copied onto the screen as needed
+hiddenCell = cell_surface()
+flagCell = cell_surface(flag)
+mineCell = cell_surface(mine)
+numberCells = [
+    cell_surface(smallFont.render(str(count), True, BLACK))
+    for count in range(9)
+]
+
+# Render the board with every cell hidden, shown at the start of each game
+board = pygame.Surface((WIDTH * cell_size, HEIGHT * cell_size))
+for i in range(HEIGHT):
+    for j in range(WIDTH):
+        board.blit(hiddenCell, (j * cell_size, i * cell_size))
+boardRect = board.get_rect()
+boardRect.topleft = board_origin
+
+# Play game button
+playButton = pygame.Rect((width / 4), (3 / 4) * height, width / 2, 50)
+
+# AI Move button
+aiButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+
+# Reset button
+resetButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+
+# Area for the won or lost text, and the text for each outcome
+statusRect = pygame.Rect(0, 0, (width / 3) - BOARD_PADDING * 2, 50)
+statusRect.center = ((5 / 6) * width, (2 / 3) * height)
+statusTexts = {
+    text: mediumFont.render(text, True, WHITE)
+    for text in ("", "Lost", "Won")
+}
+
+
+def draw_button(rect, text):
+    """
+    Draws a button with the given text.
+    """
+    buttonText = mediumFont.render(text, True, BLACK)
+    buttonRect = buttonText.get_rect()
+    buttonRect.center = rect.center
+    pygame.draw.rect(screen, WHITE, rect)
+    screen.blit(buttonText, buttonRect)
+
+
+def draw_instructions():
+    """
+    Draws the instructions screen.
+    """
+    screen.fill(BLACK)
+
+    # Title
+    title = largeFont.render("Play Minesweeper", True, WHITE)
+    titleRect = title.get_rect()
+    titleRect.center = ((width / 2), 50)
+    screen.blit(title, titleRect)
+
+    # Rules
+    rules = [
+        "Click a cell to reveal it.",
+        "Right-click a cell to mark it as a mine.",
+        "Mark all mines successfully to win!"
+    ]
+    for i, rule in enumerate(rules):
+        line = smallFont.render(rule, True, WHITE)
+        lineRect = line.get_rect()
+        lineRect.center = ((width / 2), 150 + 30 * i)
+        screen.blit(line, lineRect)
+
+    draw_button(playButton, "Play Game")
+
+
+def draw_game():
+    """
+    Draws the whole game screen, with every cell hidden.
+    """
+    screen.fill(BLACK)
+    screen.blit(board, boardRect)
+    draw_button(aiButton, "AI Move")
+    draw_button(resetButton, "Reset")
+    draw_status()
+
+
+def draw_cell(cell):
+    """
+    Draws a cell as it should currently look, returning the area drawn.
+    """
+    i, j = cell
+    if game.is_mine(cell) and lost:
+        surface = mineCell
+    elif cell in flags:
+        surface = flagCell
+    elif cell in revealed:
+        surface = numberCells[game.nearby_mines(cell)]
+    else:
+        surface = hiddenCell
+    return screen.blit(surface, (
+        board_origin[0] + j * cell_size,
+        board_origin[1] + i * cell_size
+    ))
+
+
+def draw_status():
+    """
+    Draws whether the game is won or lost, returning the area drawn.
+    """
+    text = "Lost" if lost else "Won" if game.mines == flags else ""
+    text = statusTexts[text]
+    textRect = text.get_rect()
+    textRect.center = statusRect.center
+    screen.fill(BLACK, statusRect)
+    screen.blit(text, textRect)
+    return statusRect
+
+
+def cell_at(position):
+    """
+    Returns the cell at a position on the screen, or None if there is none.
+    """
+    if not boardRect.collidepoint(position):
+        return None
+    return (
+        (position[1] - board_origin[1]) // cell_size,
+        (position[0] - board_origin[0]) // cell_size
+    )
+
+
 # Create game and AI agent
 game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
+ai = MinesweeperAI(height=HEIGHT, width=WIDTH, mines=MINES)
 
 # Keep track of revealed cells, flagged cells, and if a mine was hit
 revealed = set()
@@ -48,175 +202,109 @@ lost = False
 
 # Show instructions initially
 instructions = True
+draw_instructions()
+pygame.display.flip()
 
 while True:
 
-    # Check if game quit
-    for event in pygame.event.get():
+    # Wait for something to happen, without drawing too often
+    clock.tick(FPS)
+    events = [pygame.event.wait()] + pygame.event.get()
+
+    # Parts of the screen that have changed
+    dirty = []
+
+    for event in events:
+
+        # Check if game quit
         if event.type == pygame.QUIT:
             sys.exit()
 
-    screen.fill(BLACK)
+        # Redraw everything if the window needs it
+        if event.type == pygame.VIDEOEXPOSE:
+            if instructions:
+                draw_instructions()
+            else:
+                draw_game()
+                shown = revealed | flags
+                if lost:
+                    shown |= game.mines
+                for cell in shown:
+                    draw_cell(cell)
+            dirty.append(screen.get_rect())
+            continue
 
-    # Show game instructions
-    if instructions:
-
-        # Title
-        title = largeFont.render("Play Minesweeper", True, WHITE)
-        titleRect = title.get_rect()
-        titleRect.center = ((width / 2), 50)
-        screen.blit(title, titleRect)
-
-        # Rules
-        rules = [
-            "Click a cell to reveal it.",
-            "Right-click a cell to mark it as a mine.",
-            "Mark all mines successfully to win!"
-        ]
-        for i, rule in enumerate(rules):
-            line = smallFont.render(rule, True, WHITE)
-            lineRect = line.get_rect()
-            lineRect.center = ((width / 2), 150 + 30 * i)
-            screen.blit(line, lineRect)
-
-        # Play game button
-        buttonRect = pygame.Rect((width / 4), (3 / 4) * height, width / 2, 50)
-        buttonText = mediumFont.render("Play Game", True, BLACK)
-        buttonTextRect = buttonText.get_rect()
-        buttonTextRect.center = buttonRect.center
-        pygame.draw.rect(screen, WHITE, buttonRect)
-        screen.blit(buttonText, buttonTextRect)
+        if event.type != pygame.MOUSEBUTTONDOWN:
+            continue
 
         # Check if play button clicked
-        click, _, _ = pygame.mouse.get_pressed()
-        if click == 1:
-            mouse = pygame.mouse.get_pos()
-            if buttonRect.collidepoint(mouse):
+        if instructions:
+            if event.button == 1 and playButton.collidepoint(event.pos):
                 instructions = False
-                time.sleep(0.3)
-
-        pygame.display.flip()
-        continue
-
-    # Draw board
-    cells = []
-    for i in range(HEIGHT):
-        row = []
-        for j in range(WIDTH):
-
-            # Draw rectangle for cell
-            rect = pygame.Rect(
-                board_origin[0] + j * cell_size,
-                board_origin[1] + i * cell_size,
-                cell_size, cell_size
-            )
-            pygame.draw.rect(screen, GRAY, rect)
-            pygame.draw.rect(screen, WHITE, rect, 3)
-
-            # Add a mine, flag, or number if needed
-            if game.is_mine((i, j)) and lost:
-                screen.blit(mine, rect)
-            elif (i, j) in flags:
-                screen.blit(flag, rect)
-            elif (i, j) in revealed:
-                neighbors = smallFont.render(
-                    str(game.nearby_mines((i, j))),
-                    True, BLACK
-                )
-                neighborsTextRect = neighbors.get_rect()
-                neighborsTextRect.center = rect.center
-                screen.blit(neighbors, neighborsTextRect)
-
-            row.append(rect)
-        cells.append(row)
-
-    # AI Move button
-    aiButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("AI Move", True, BLACK)
-    buttonRect = buttonText.get_rect()
-    buttonRect.center = aiButton.center
-    pygame.draw.rect(screen, WHITE, aiButton)
-    screen.blit(buttonText, buttonRect)
-
-    # Reset button
-    resetButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("Reset", True, BLACK)
-    buttonRect = buttonText.get_rect()
-    buttonRect.center = resetButton.center
-    pygame.draw.rect(screen, WHITE, resetButton)
-    screen.blit(buttonText, buttonRect)
-
-    # Display text
-    text = "Lost" if lost else "Won" if game.mines == flags else ""
-    text = mediumFont.render(text, True, WHITE)
-    textRect = text.get_rect()
-    textRect.center = ((5 / 6) * width, (2 / 3) * height)
-    screen.blit(text, textRect)
-
-    move = None
+                draw_game()
+                dirty.append(screen.get_rect())
+            continue
 
-    left, _, right = pygame.mouse.get_pressed()
+        move = None
+        cell = cell_at(event.pos)
 
-    # Check for a right-click to toggle flagging
-    if right == 1 and not lost:
-        mouse = pygame.mouse.get_pos()
-        for i in range(HEIGHT):
-            for j in range(WIDTH):
-                if cells[i][j].collidepoint(mouse) and (i, j) not in revealed:
-                    if (i, j) in flags:
-                        flags.remove((i, j))
-                    else:
-                        flags.add((i, j))
-                    time.sleep(0.2)
+        # Check for a right-click to toggle flagging
+        if event.button == 3 and not lost:
+            if cell is not None and cell not in revealed:
+                if cell in flags:
+                    flags.remove(cell)
+                else:
+                    flags.add(cell)
+                dirty.append(draw_cell(cell))
 
-    elif left == 1:
-        mouse = pygame.mouse.get_pos()
+        elif event.button == 1:
 
-        # If AI button clicked, make an AI move
-        if aiButton.collidepoint(mouse) and not lost:
-            move = ai.make_safe_move()
-            if move is None:
-                move = ai.make_random_move()
+            # If AI button clicked, make an AI move
+            if aiButton.collidepoint(event.pos) and not lost:
+                move = ai.make_safe_move()
                 if move is None:
-                    flags = ai.mines.copy()
-                    print("No moves left to make.")
+                    move = ai.make_random_move()
+                    if move is None:
+                        changed = flags ^ ai.mines
+                        flags = ai.mines.copy()
+                        dirty.extend(draw_cell(cell) for cell in changed)
+                        print("No moves left to make.")
+                    else:
+                        print("No known safe moves, AI making random move.")
                 else:
-                    print("No known safe moves, AI making random move.")
+                    print("AI making safe move.")
+
+            # Reset game state
+            elif resetButton.collidepoint(event.pos):
+                game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
+                ai = MinesweeperAI(height=HEIGHT, width=WIDTH, mines=MINES)
+                revealed = set()
+                flags = set()
+                lost = False
+                draw_game()
+                dirty.append(screen.get_rect())
+                continue
+
+            # User-made move
+            elif (not lost and cell is not None
+                    and cell not in flags
+                    and cell not in revealed):
+                move = cell
+
+        # Make move and update AI knowledge
+        if move:
+            if game.is_mine(move):
+                lost = True
+                dirty.extend(draw_cell(cell) for cell in game.mines)
             else:
-                print("AI making safe move.")
-            time.sleep(0.2)
-
-        # Reset game state
-        elif resetButton.collidepoint(mouse):
-            game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-            ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
-            revealed = set()
-            flags = set()
-            lost = False
-            continue
+                opened = game.reveal(move, flags)
+                revealed.update(cell for cell, _ in opened)
+                flags.discard(move)
+                ai.add_knowledge_batch(opened)
+                dirty.extend(draw_cell(cell) for cell, _ in opened)
+
+        dirty.append(draw_status())
 
-        # User-made move
-        elif not lost:
-            for i in range(HEIGHT):
-                for j in range(WIDTH):
-                    if (cells[i][j].collidepoint(mouse)
-                            and (i, j) not in flags
-                            and (i, j) not in revealed):
-                        move = (i, j)
-
-    # Make move and update AI knowledge
-    if move:
-        if game.is_mine(move):
-            lost = True
-        else:
-            nearby = game.nearby_mines(move)
-            revealed.add(move)
-            ai.add_knowledge(move, nearby)
-
-    pygame.display.flip()
+    # Copy only the changed parts of the screen to the display
+    if dirty:
+        pygame.display.update(dirty)
@@ -0,0 +1,156 @@
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+HEIGHT = 8
+WIDTH = 8
+MINES = 8
+
+# Game n is played with random seed SEED + n
+SEED = 0
+
+
+def main():
+    if len(sys.argv) not in (2, 5, 6, 7):
+        sys.exit("Usage: python simulate.py games "
+                 "[height width mines [processes [trace]]]")
+    games = int(sys.argv[1])
+    height, width, mines = HEIGHT, WIDTH, MINES
+    if len(sys.argv) >= 5:
+        height, width, mines = (int(arg) for arg in sys.argv[2:5])
+    processes = int(sys.argv[5]) if len(sys.argv) >= 6 else None
+    trace = sys.argv[6] if len(sys.argv) == 7 else None
+
+    results = simulate(games, height, width, mines, processes,
+                       metrics=trace is not None)
+    print(f"Games: {games} ({height}x{width}, {mines} mines, seed {SEED})")
+    print(f"Win rate: {results['wins'] / games:.1%}")
+    print(f"Moves per game: {results['moves'] / games:.1f}")
+    for name in ("add_knowledge", "move"):
+        times = results[name]
+        print(f"{name}: p50 {percentile(times, 50) * 1000:.3f} ms, "
+              f"p99 {percentile(times, 99) * 1000:.3f} ms")
+    print("Moves are chosen with no time budget, so move times may exceed "
+          "the runner's time budget")
+
+    # Summarize the AI's metrics and save them with each game's trace
+    if trace is not None:
+        totals = results["metrics"]
+        batches = max(totals["batches"], 1)
+        print(f"Per batch: {totals['cells'] / batches:.1f} cells, "
+              f"{totals['rounds'] / batches:.2f} inference rounds, "
+              f"{totals['compared'] / batches:.1f} sentences compared")
+        for phase in ("update", "inference"):
+            seconds = totals[f"{phase}_time"]
+            print(f"{phase} time: {seconds:.3f} s total, "
+                  f"{seconds / batches * 1000:.3f} ms per batch")
+        with open(trace, "w") as f:
+            json.dump(results["games"], f)
+        print(f"Trace saved to {trace}")
+
+
+def simulate(games, height, width, mines, processes=None, metrics=False):
+    """
+    Plays `games` games across a pool of `processes` processes (one per
+    CPU by default), and returns a dictionary with the number of games
+    won, the total number of moves, and the seconds taken to choose each
+    move and to add the knowledge it revealed. Moves are chosen with no
+    time budget, as in `play`, so the seconds taken to choose them are
+    not bounded by the runner's budget and may exceed it.
+
+    If `metrics` is true, the dictionary also holds the totals of the
+    AI's metrics counters over all games under "metrics", and a list
+    with the seed, outcome and metrics of each game under "games".
+    """
+    arguments = [(SEED + n, height, width, mines, metrics)
+                 for n in range(games)]
+    if processes == 1:
+        outcomes = map(play, arguments)
+    else:
+        pool = multiprocessing.Pool(processes)
+        outcomes = pool.imap(play, arguments, chunksize=8)
+
+    results = {"wins": 0, "moves": 0, "add_knowledge": [], "move": []}
+    if metrics:
+        results["metrics"] = dict.fromkeys(MinesweeperAI.COUNTERS, 0)
+        results["games"] = []
+    for seed, won, moves, add_times, move_times, counters in outcomes:
+        results["wins"] += won
+        results["moves"] += moves
+        results["add_knowledge"].extend(add_times)
+        results["move"].extend(move_times)
+        if metrics:
+            for name in MinesweeperAI.COUNTERS:
+                results["metrics"][name] += counters[name]
+            results["games"].append({
+                "seed": seed, "won": won, "moves": moves, "metrics": counters
+            })
+
+    if processes != 1:
+        pool.close()
+        pool.join()
+    return results
+
+
+def play(arguments):
+    """
+    Plays one game with the given seed and board size. The seed fixes
+    both the board and the AI's random choices, so a game plays out the
+    same way in any process. The AI is given no time budget for weighing
+    guesses, which are then limited only by its state and sample counts,
+    so the game also plays out the same way on any machine. Each move
+    reveals the cells the game opens with it, which the AI takes in as
+    one batch. Returns the seed, whether the game was won, the number of
+    moves made, the seconds taken by each call to add_knowledge_batch and
+    to choose each move, and the AI's metrics if they were enabled.
+    """
+    seed, height, width, mines, metrics = arguments
+    random.seed(seed)
+    game = Minesweeper(height=height, width=width, mines=mines)
+    ai = MinesweeperAI(height=height, width=width, mines=mines,
+                       metrics=metrics)
+    ai.time_budget = math.inf
+    add_times = []
+    move_times = []
+    revealed = 0
+
+    while revealed < height * width - mines:
+
+        # Choose a move the same way as the runner's AI button
+        start = time.perf_counter()
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+        if move is None:
+            break
+        move_times.append(time.perf_counter() - start)
+        if game.is_mine(move):
+            break
+
+        cells = game.reveal(move)
+        start = time.perf_counter()
+        ai.add_knowledge_batch(cells)
+        add_times.append(time.perf_counter() - start)
+        revealed += len(cells)
+
+    won = revealed == height * width - mines
+    return seed, won, len(move_times), add_times, move_times, ai.metrics
+
+
+def percentile(values, percent):
+    """
+    Returns the value below which `percent` percent of `values` fall.
+    """
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+if __name__ == "__main__":
+    main()
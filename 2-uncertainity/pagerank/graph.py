@@ -0,0 +1,498 @@
+import functools
+import multiprocessing
+import os
+
+import numpy as np
+
+# Default bound on the L1 change in ranks between iterations at convergence
+TOLERANCE = 1e-6
+
+# Default number of random surfers to move at once when sampling
+WALKERS = 1000
+
+# Default number of blocks of pages updated in turn by a Gauss-Seidel sweep
+BLOCKS = 64
+
+# Default number of links read at a time by each step of power iteration
+BLOCK_LINKS = 1 << 22
+
+# Default number of iterations between extrapolations
+PERIOD = 10
+
+# Norms by which power iteration can measure the change in ranks
+NORMS = {
+    "l1": lambda change: np.abs(change).sum(),
+    "l2": lambda change: np.sqrt(np.dot(change, change)),
+    "max": lambda change: np.abs(change).max(),
+}
+
+
+class LinkGraph():
+    """
+    Link graph of a corpus in compressed sparse row form.
+
+    Pages are numbered in the order of self.pages. The pages linked to by
+    page i are self.targets[self.offsets[i]:self.offsets[i + 1]], so the
+    whole graph is two integer arrays however many links it has. Saved
+    graphs are loaded with these arrays mapped from disk, and nothing
+    else kept in memory grows with the number of links.
+    """
+
+    def __init__(self, pages, offsets, targets):
+        self.pages = list(pages)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.degrees = np.diff(self.offsets)
+
+        # Pages with no links are treated as linking to every page
+        self.dangling = self.degrees == 0
+        self.inverse_degrees = np.zeros(len(self.pages))
+        np.divide(1.0, self.degrees, out=self.inverse_degrees,
+                  where=~self.dangling)
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Returns the graph of a corpus given as a dictionary from each
+        page to the set of pages it links to.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        degrees = np.fromiter((len(corpus[page]) for page in pages),
+                              dtype=np.int64, count=len(pages))
+        offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=offsets[1:])
+        targets = np.fromiter(
+            (index[link] for page in pages for link in sorted(corpus[page])),
+            dtype=np.int64, count=offsets[-1]
+        )
+        return cls(pages, offsets, targets)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Returns the graph saved in a directory by LinkGraph.save, with its
+        arrays mapped into memory rather than read if `mmap` is true.
+        """
+        with open(os.path.join(directory, "pages.txt"), encoding="utf-8",
+                  newline="\n") as f:
+            pages = f.read().split("\n")[:-1]
+        mode = "r" if mmap else None
+        offsets, targets = (
+            np.load(os.path.join(directory, name), mmap_mode=mode)
+            for name in ("offsets.npy", "targets.npy")
+        )
+        return cls(pages, offsets, targets)
+
+    def save(self, directory):
+        """
+        Saves the graph to a directory: the page names in pages.txt, one
+        per line in page number order, and the offsets and targets arrays
+        in NumPy's .npy format, which can be mapped into memory.
+        """
+        if any("\n" in page or "\r" in page for page in self.pages):
+            raise ValueError("page names must not contain line breaks")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "pages.txt"), "w",
+                  encoding="utf-8", newline="\n") as f:
+            f.writelines(f"{page}\n" for page in self.pages)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "targets.npy"), self.targets)
+
+    @staticmethod
+    def is_saved(directory):
+        """Checks if a directory holds a graph saved by LinkGraph.save."""
+        return os.path.exists(os.path.join(directory, "offsets.npy"))
+
+    @functools.cached_property
+    def inbound(self):
+        """
+        The links of the graph in compressed sparse row form by the page
+        linked to: the pages linking to page i are
+        sources[offsets[i]:offsets[i + 1]], for (offsets, sources).
+        These are built in memory, even for graphs mapped from disk.
+        """
+        sources = np.repeat(np.arange(len(self), dtype=np.int64),
+                            self.degrees)
+        order = np.argsort(self.targets, kind="stable")
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.targets, minlength=len(self)),
+                  out=offsets[1:])
+        return offsets, sources[order]
+
+    @functools.cached_property
+    def index(self):
+        """Dictionary from each page name to its page number."""
+        return {page: i for i, page in enumerate(self.pages)}
+
+    def __len__(self):
+        return len(self.pages)
+
+    def links(self, page):
+        """Returns the array of pages that page number `page` links to."""
+        return self.targets[self.offsets[page]:self.offsets[page + 1]]
+
+    def step(self, ranks, damping_factor, teleport=None,
+             block=BLOCK_LINKS):
+        """
+        Returns the ranks after one step of the random surfer from `ranks`,
+        with the same data type.
+
+        Each page's rank is split over its links by a scatter-add over
+        the links of about `block` links' worth of pages at a time, or
+        one link for each page in the graph if that is more, since each
+        scatter-add also fills an array over all pages. Rank
+        on pages with no links is spread evenly over every page, which
+        adds the same amount to each page instead of needing a link from
+        every dangling page to every other.
+
+        If `teleport` is given, it is the distribution over pages that
+        the surfer jumps to, in place of the uniform one, both at random
+        and from pages with no links.
+
+        Links are read in order, so a graph mapped from disk is read
+        sequentially and never needs to fit in memory. Besides a few
+        arrays over pages, a step uses about 16 bytes for each link in a
+        block, so its memory is bounded by the block size or the number
+        of pages rather than the number of links.
+        """
+        size = len(self.pages)
+        block = max(block, size)
+        scaled = ranks * self.inverse_degrees
+        following = np.zeros(size, dtype=ranks.dtype)
+        for start, end in self.blocks(block):
+            shares = np.repeat(scaled[start:end], self.degrees[start:end])
+            links = self.targets[self.offsets[start]:self.offsets[end]]
+            following += np.bincount(links, weights=shares, minlength=size)
+        spread = damping_factor * ranks[self.dangling].sum()
+        spread += (1 - damping_factor) * ranks.sum()
+        following *= damping_factor
+        if teleport is None:
+            following += spread / len(self.pages)
+        else:
+            following += spread * teleport
+        return following
+
+    def blocks(self, block):
+        """
+        Returns a list of (start, end) ranges of page numbers splitting
+        the pages into blocks of about `block` links each, or of a single
+        page with more links than that.
+        """
+        bounds = np.searchsorted(self.offsets,
+                                 np.arange(0, self.offsets[-1], block))
+        bounds = np.unique(np.concatenate([bounds, [0, len(self.pages)]]))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def sweep(self, ranks, damping_factor, blocks=BLOCKS, teleport=None):
+        """
+        Updates `ranks` in place by one Gauss-Seidel sweep of the random
+        surfer, and returns it.
+
+        Pages are updated `blocks` blocks at a time, each from the pages
+        linking to it, so that later blocks already use the new ranks of
+        earlier ones. The rank spread evenly over every page, or by
+        `teleport` as for LinkGraph.step, from pages with no links and
+        from jumps to a random page, is kept up to date as the ranks
+        change.
+        """
+        offsets, sources = self.inbound
+        size = len(self.pages)
+        spread = damping_factor * ranks[self.dangling].sum()
+        spread += (1 - damping_factor) * ranks.sum()
+        shares = ranks * self.inverse_degrees
+        bounds = np.linspace(0, size, blocks + 1).astype(np.int64)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            linking = sources[offsets[start]:offsets[end]]
+            pages = np.repeat(np.arange(end - start),
+                              np.diff(offsets[start:end + 1]))
+            following = damping_factor * np.bincount(
+                pages, weights=np.take(shares, linking),
+                minlength=end - start
+            )
+            if teleport is None:
+                following += spread / size
+            else:
+                following += spread * teleport[start:end]
+            change = following - ranks[start:end]
+            spread += damping_factor * change[self.dangling[start:end]].sum()
+            spread += (1 - damping_factor) * change.sum()
+            ranks[start:end] = following
+            shares[start:end] = following * self.inverse_degrees[start:end]
+        return ranks
+
+    def ranks(self, vector):
+        """
+        Returns a dictionary from each page name to its value in `vector`.
+        """
+        return dict(zip(self.pages, vector.tolist()))
+
+    def with_links(self, added=(), removed=()):
+        """
+        Returns a copy of the graph with links added and removed, each
+        given as a (page, linked page) pair of page names. Pages not yet
+        in the graph are added after the existing ones, in the order they
+        first appear, and links already present are not added twice.
+
+        Only the slices of graph.targets for pages whose links change are
+        rebuilt; the rest are copied across unchanged.
+        """
+        pages = list(self.pages)
+        index = dict(self.index)
+        for link in added:
+            for page in link:
+                if page not in index:
+                    index[page] = len(pages)
+                    pages.append(page)
+
+        # New links of each page whose links change
+        changed = dict()
+
+        def links(source):
+            if source not in changed:
+                changed[source] = (
+                    self.links(source).tolist() if source < len(self) else []
+                )
+            return changed[source]
+
+        for source, target in removed:
+            if source in index and target in index:
+                target = index[target]
+                links(index[source])[:] = [
+                    link for link in links(index[source]) if link != target
+                ]
+        for source, target in added:
+            if index[target] not in links(index[source]):
+                links(index[source]).append(index[target])
+
+        degrees = np.zeros(len(pages), dtype=np.int64)
+        degrees[:len(self)] = self.degrees
+        pieces = []
+        end = 0
+        for source in sorted(changed):
+            if source < len(self):
+                pieces.append(self.targets[end:self.offsets[source]])
+                end = self.offsets[source + 1]
+            else:
+                pieces.append(self.targets[end:])
+                end = len(self.targets)
+            pieces.append(np.array(changed[source], dtype=np.int64))
+            degrees[source] = len(changed[source])
+        pieces.append(self.targets[end:])
+
+        offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=offsets[1:])
+        graph = LinkGraph(pages, offsets, np.concatenate(pieces))
+        graph.index = index
+        return graph
+
+
+def power_iteration(graph, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=1000, start=None, norm="l1",
+                    method="jacobi", extrapolation=None, period=PERIOD,
+                    teleport=None, dtype=np.float64):
+    """
+    Returns the PageRank vector of a graph, computed by repeatedly
+    stepping the random surfer from `start`, or the uniform distribution
+    by default, until the ranks change by less than `tolerance` in the
+    given norm, along with the list of those changes, one for each
+    iteration.
+
+    `norm` is one of NORMS. `method` is "jacobi" to compute each
+    iteration from the last, or "gauss-seidel" to update the ranks in
+    place by LinkGraph.sweep. If `extrapolation` is "aitken" or
+    "quadratic", every `period` iterations the ranks are replaced by an
+    extrapolation from the last few iterations towards their limit.
+    `teleport` is the distribution the surfer jumps to, as for
+    LinkGraph.step, which personalizes the ranks to the pages it favors.
+
+    Ranks are kept in arrays of `dtype`, which may be np.float32 to
+    halve their size on large graphs, at the cost of a tolerance no finer
+    than about 1e-7 in L1. With the graph loaded by LinkGraph.load and
+    the "jacobi" method, links stay on disk and are read a block at a
+    time by LinkGraph.step, so memory holds only arrays over pages: the
+    graph's degrees, 17 bytes a page, and a few rank vectors, besides
+    one block of links. Peak memory is then the same however many links
+    there are.
+    """
+    if norm not in NORMS:
+        raise ValueError(f"unknown norm: {norm}")
+    if method not in ("jacobi", "gauss-seidel"):
+        raise ValueError(f"unknown method: {method}")
+    if extrapolation not in (None, "aitken", "quadratic"):
+        raise ValueError(f"unknown extrapolation: {extrapolation}")
+
+    if start is None:
+        ranks = np.full(len(graph), 1 / len(graph), dtype=dtype)
+    else:
+        ranks = np.array(start, dtype=dtype)
+    residuals = []
+    iterates = []
+    for iteration in range(1, max_iterations + 1):
+        if method == "jacobi":
+            following = graph.step(ranks, damping_factor, teleport)
+        else:
+            following = graph.sweep(ranks.copy(), damping_factor,
+                                    teleport=teleport)
+        residuals.append(float(NORMS[norm](following - ranks)))
+        ranks = following
+        if residuals[-1] < tolerance:
+            break
+
+        if extrapolation is not None:
+            iterates = iterates[-3:] + [ranks]
+            if iteration % period == 0 and len(iterates) == 4:
+                if extrapolation == "aitken":
+                    ranks = aitken(*iterates[-3:])
+                else:
+                    ranks = quadratic(*iterates)
+                iterates = []
+    return ranks / ranks.sum(), residuals
+
+
+def aitken(first, second, third):
+    """
+    Returns the limit of each page's rank extrapolated from three
+    successive iterations by Aitken's delta-squared process, keeping the
+    last rank of pages where that is undefined or not positive.
+    """
+    change = third - second
+    curvature = change - (second - first)
+    limit = third.copy()
+    defined = curvature != 0
+    limit[defined] -= change[defined] ** 2 / curvature[defined]
+    limit[limit <= 0] = third[limit <= 0]
+    return limit / limit.sum()
+
+
+def quadratic(first, second, third, fourth):
+    """
+    Returns the ranks extrapolated from four successive iterations by
+    quadratic extrapolation (Kamvar et al., 2003): the iterations are
+    fitted as combinations of the first three eigenvectors of the
+    transition matrix, and the ranks are the part along the first one.
+    """
+    differences = np.stack([second - first, third - first], axis=1)
+    (gamma1, gamma2), *_ = np.linalg.lstsq(differences, -(fourth - first),
+                                           rcond=None)
+    limit = (gamma1 + gamma2 + 1) * second + (gamma2 + 1) * third + fourth
+    limit = np.abs(limit)
+    return limit / limit.sum()
+
+
+class RankedGraph():
+    """
+    Link graph kept together with its PageRank vector, so that after a
+    few links change the ranks can be recomputed starting from the old
+    ones, which are already close, rather than from scratch.
+    """
+
+    def __init__(self, graph, damping_factor, tolerance=TOLERANCE):
+        self.graph = graph
+        self.damping_factor = damping_factor
+        self.tolerance = tolerance
+        self.vector, residuals = power_iteration(
+            graph, damping_factor, tolerance
+        )
+
+        # Iterations taken by the last computation of the ranks
+        self.iterations = len(residuals)
+
+    def ranks(self):
+        """Returns a dictionary from each page name to its PageRank."""
+        return self.graph.ranks(self.vector)
+
+    def update(self, added=(), removed=()):
+        """
+        Adds and removes links given as (page, linked page) pairs of page
+        names, then updates the ranks by power iteration started from the
+        previous ones, with new pages starting at the uniform rank.
+        Returns the number of iterations it took.
+        """
+        self.graph = self.graph.with_links(added, removed)
+        start = np.full(len(self.graph), 1 / len(self.graph))
+        start[:len(self.vector)] = self.vector
+        start /= start.sum()
+        self.vector, residuals = power_iteration(
+            self.graph, self.damping_factor, self.tolerance, start=start
+        )
+        self.iterations = len(residuals)
+        return self.iterations
+
+
+def walk(graph, damping_factor, samples, walkers, rng):
+    """
+    Returns the number of visits to each page made by `walkers` random
+    surfers, started at random pages and moved together, once they have
+    made at least `samples` visits between them.
+
+    Each step costs the same for every walker: a random mask picks the
+    walkers that jump to a random page, along with those on pages with
+    no links, and the rest follow a link picked by a random offset into
+    their page's slice of graph.targets. A jump lands on a random page
+    just like the start, so a walker's visits split into independent
+    runs from one jump to the next. A run cut off at the end would
+    over-count pages near its start, so once enough steps are made,
+    walkers stop at the end of their current run instead.
+    """
+    pages = len(graph)
+    visits = np.zeros(pages, dtype=np.int64)
+    positions = rng.integers(0, pages, walkers)
+    steps = -(-samples // walkers)
+
+    # Pages visited since visits was last updated, counted in batches of
+    # at least as many visits as pages so that counting costs O(1) each
+    visited = []
+    pending = 0
+
+    step = 0
+    while len(positions):
+        visited.append(positions)
+        pending += len(positions)
+        if pending >= pages:
+            visits += np.bincount(np.concatenate(visited), minlength=pages)
+            visited = []
+            pending = 0
+
+        # Jump with probability 1 - damping, or else follow a link
+        jumps = rng.random(len(positions)) >= damping_factor
+        jumps |= graph.dangling[positions]
+        following = rng.integers(0, pages, len(positions))
+        moving = np.flatnonzero(~jumps)
+        origins = positions[moving]
+        following[moving] = graph.targets[
+            graph.offsets[origins] + rng.integers(0, graph.degrees[origins])
+        ]
+        positions = following
+
+        step += 1
+        if step >= steps:
+            positions = positions[~jumps]
+
+    if visited:
+        visits += np.bincount(np.concatenate(visited), minlength=pages)
+    return visits
+
+
+def sample_ranks(graph, damping_factor, samples, walkers=WALKERS, rng=None,
+                 processes=1):
+    """
+    Returns PageRank values estimated from about `samples` pages visited
+    by random surfers, `walkers` at a time, using the random generator or
+    seed `rng`. Split over more than one process, each process runs its
+    share of the walkers with its own generator spawned from `rng`, so the
+    result for a given seed depends on the number of processes too.
+    """
+    rng = np.random.default_rng(rng)
+    walkers = max(1, min(walkers, samples // 100))
+    if processes == 1:
+        visits = walk(graph, damping_factor, samples, walkers, rng)
+    else:
+        shares = [
+            (graph, damping_factor, -(-samples // processes),
+             -(-walkers // processes), generator)
+            for generator in rng.spawn(processes)
+        ]
+        with multiprocessing.Pool(processes) as pool:
+            visits = sum(pool.starmap(walk, shares))
+    return visits / visits.sum()
@@ -1,43 +1,92 @@
-import copy
+import json
+import multiprocessing
 import os
-import random
 import re
 import sys
 
+from graph import TOLERANCE, LinkGraph, power_iteration, sample_ranks
+
 DAMPING = 0.85
 SAMPLES = 10000
 
+# File in each corpus directory caching the links found in its pages
+CACHE = ".links.json"
+
+# Characters of a page read at a time when extracting its links
+CHUNK_SIZE = 1 << 16
+
+# Fewest pages to parse before parsing them across processes
+PARALLEL_PAGES = 256
+
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python pagerank.py corpus [graph]")
+
+    # Rank a saved link graph directly, or crawl a directory of pages
+    if LinkGraph.is_saved(sys.argv[1]):
+        graph = LinkGraph.load(sys.argv[1])
+    else:
+        graph = LinkGraph.from_corpus(crawl(sys.argv[1]))
+    if len(sys.argv) == 3:
+        graph.save(sys.argv[2])
+
+    ranks = graph.ranks(sample_ranks(graph, DAMPING, SAMPLES))
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
+    ranks = graph.ranks(power_iteration(graph, DAMPING)[0])
     print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
 
 
-def crawl(directory):
+def crawl(directory, processes=None):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
+
+    Links found in each page are cached in the directory along with the
+    page's size and modification time, and only pages where either has
+    changed are parsed again, across `processes` processes (one per CPU
+    by default) if there are many of them.
     """
+    cache = load_cache(directory)
+    files = dict()
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".html") and entry.is_file():
+            stat = entry.stat()
+            files[entry.name] = [stat.st_size, stat.st_mtime_ns]
+
+    # Extract all links from HTML files that are not cached
     pages = dict()
+    changed = []
+    for filename, key in files.items():
+        if filename in cache and cache[filename][:2] == key:
+            pages[filename] = set(cache[filename][2])
+        else:
+            changed.append(filename)
+    paths = [os.path.join(directory, filename) for filename in changed]
+    if len(paths) >= PARALLEL_PAGES and processes != 1:
+        with multiprocessing.Pool(processes) as pool:
+            found = pool.map(extract_links, paths, chunksize=64)
+    else:
+        found = map(extract_links, paths)
+    for filename, links in zip(changed, found):
+        pages[filename] = links
 
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+    if changed or len(cache) != len(files):
+        save_cache(directory, {
+            filename: key + [sorted(pages[filename])]
+            for filename, key in files.items()
+        })
+
+    # Pages don't count as linking to themselves
+    for filename in pages:
+        pages[filename].discard(filename)
 
     # Only include links to other pages in the corpus
     for filename in pages:
@@ -49,6 +98,53 @@ def crawl(directory):
     return pages
 
 
+def extract_links(path):
+    """
+    Return the set of links in an HTML file, reading it a chunk at a time
+    so that the whole page is never in memory at once.
+    """
+    links = set()
+    text = ""
+    with open(path) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ""):
+            text += chunk
+            end = 0
+            for match in LINK.finditer(text):
+                links.add(match.group(1))
+                end = match.end()
+
+            # Keep any tag after the last link, which may not be complete
+            start = text.rfind("<", end)
+            text = text[start:] if start != -1 else ""
+    return links
+
+
+def load_cache(directory):
+    """
+    Return the cached links of a corpus directory, as a dictionary from
+    each file name to a list of its size, modification time and links,
+    or an empty dictionary if there is no readable cache.
+    """
+    try:
+        with open(os.path.join(directory, CACHE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+
+def save_cache(directory, cache):
+    """
+    Save the links of a corpus directory to its cache, if it is writable.
+    """
+    path = os.path.join(directory, CACHE)
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(cache, f)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -83,47 +179,26 @@ def sample_pagerank(corpus, damping_factor, n):
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    distribution = {}.fromkeys(corpus.keys(), 0)
-    page = random.choices(list(corpus.keys()))[0]
+    graph = LinkGraph.from_corpus(corpus)
+    return graph.ranks(sample_ranks(graph, damping_factor, n))
 
-    for i in range(1, n):
-        curr_distribution = transition_model(corpus, page, damping_factor)
-        for _page in distribution:
-            distribution[_page] = (((i-1) * distribution[_page]) + curr_distribution[_page]) / i
-        page = random.choices(list(distribution.keys()), weights=list(distribution.values()), k=1)[0]
 
-    return distribution
-
-
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, tolerance=TOLERANCE, norm="l1",
+                     method="jacobi", extrapolation=None):
     """
     Return PageRank values for each page by iteratively updating
-    PageRank values until convergence.
+    PageRank values until convergence, when they change by less than
+    `tolerance` in the given norm. The method and extrapolation are as
+    for graph.power_iteration.
 
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    total_pages = len(corpus)
-    distribution = {}.fromkeys(corpus.keys(), 1.0 / total_pages)
-    change = True
-
-    while change:
-        change = False
-        old_distribution = copy.deepcopy(distribution)
-        for page in corpus:
-            distribution[page] = ((1 - damping_factor)/total_pages) + (damping_factor * get_sum(corpus, distribution, page))
-            change = change or abs(old_distribution[page] - distribution[page]) > 0.001
-
-    return distribution
-
-
-def get_sum(corpus, distribution, page):
-    result = 0
-    for p in corpus:
-        if page in corpus[p]:
-            result += distribution[p] / len(corpus[p])
-    return result
+    graph = LinkGraph.from_corpus(corpus)
+    ranks, _ = power_iteration(graph, damping_factor, tolerance, norm=norm,
+                               method=method, extrapolation=extrapolation)
+    return graph.ranks(ranks)
 
 
 if __name__ == "__main__":
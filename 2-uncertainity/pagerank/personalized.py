@@ -0,0 +1,180 @@
+import collections
+import heapq
+
+import numpy as np
+
+from graph import TOLERANCE, power_iteration
+
+# Default bound on the rank left unpushed per link of a page by forward push
+EPSILON = 1e-5
+
+# Default number of random surfers whose final pages are counted
+WALKS = 100000
+
+# Default number of seed sets whose ranks are kept for repeat queries
+CACHE_SIZE = 128
+
+
+class PersonalizedPageRank():
+    """
+    PageRank of a link graph personalized to sets of seed pages: the
+    random surfer jumps to a random seed page instead of any page, both
+    with probability 1 - damping_factor and from pages with no links.
+
+    Ranks are computed with `method`, one of "iterate", "push" or
+    "sample", and kept for the last `cache_size` seed sets queried.
+    """
+
+    def __init__(self, graph, damping_factor, method="iterate",
+                 cache_size=CACHE_SIZE):
+        if method not in ("iterate", "push", "sample"):
+            raise ValueError(f"unknown method: {method}")
+        self.graph = graph
+        self.damping_factor = damping_factor
+        self.method = method
+        self.cache_size = cache_size
+
+        # Ranks of recent seed sets, from least to most recently used
+        self.cache = collections.OrderedDict()
+
+    def ranks(self, seeds):
+        """
+        Returns the personalized ranks for a collection of seed page
+        names, as an array over all pages when iterating or as a
+        dictionary from page number to rank for pages with any rank.
+        """
+        key = frozenset(seeds)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        seeds = np.array(sorted(self.graph.index[page] for page in key),
+                         dtype=np.int64)
+        if self.method == "iterate":
+            ranks = personalized_ranks(self.graph, self.damping_factor,
+                                       seeds)
+        elif self.method == "push":
+            ranks = forward_push(self.graph, self.damping_factor, seeds)
+        else:
+            ranks = sample_personalized(self.graph, self.damping_factor,
+                                        seeds)
+
+        self.cache[key] = ranks
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return ranks
+
+    def top(self, seeds, k):
+        """
+        Returns a list of the `k` highest ranked pages for a collection of
+        seed page names, as (page name, rank) pairs in descending order.
+        """
+        return [
+            (self.graph.pages[page], rank)
+            for page, rank in top(self.ranks(seeds), k)
+        ]
+
+
+def personalized_ranks(graph, damping_factor, seeds, tolerance=TOLERANCE):
+    """
+    Returns the array of ranks personalized to an array of seed page
+    numbers, computed by power iteration.
+    """
+    teleport = np.zeros(len(graph))
+    teleport[seeds] = 1 / len(seeds)
+    ranks, _ = power_iteration(graph, damping_factor, tolerance,
+                               start=teleport, teleport=teleport)
+    return ranks
+
+
+def forward_push(graph, damping_factor, seeds, epsilon=EPSILON):
+    """
+    Returns a dictionary from page number to rank, personalized to an
+    array of seed page numbers, estimated by forward push.
+
+    Each page holds a residual of rank not yet given out, starting with
+    the seeds. Pushing a page keeps 1 - damping_factor of its residual as
+    rank and passes the rest on along its links, or back to the seeds if
+    it has none. Only pages with a residual of at least `epsilon` for
+    each of their links are pushed, so the work done depends on epsilon
+    and the pages near the seeds, not the size of the graph. Estimates
+    never exceed the true ranks, and fall short only by the rank that
+    the residuals left over would still give out.
+    """
+    seeds = seeds.tolist()
+    estimates = collections.defaultdict(float)
+    residuals = collections.defaultdict(float)
+    for seed in seeds:
+        residuals[seed] = 1 / len(seeds)
+
+    def threshold(page):
+        return epsilon * max(int(graph.degrees[page]), 1)
+
+    queue = collections.deque(
+        page for page in residuals if residuals[page] >= threshold(page)
+    )
+    while queue:
+        page = queue.popleft()
+        residual = residuals.pop(page)
+        estimates[page] += (1 - damping_factor) * residual
+        links = graph.links(page).tolist()
+        if links:
+            share = damping_factor * residual / len(links)
+        else:
+            links = seeds
+            share = damping_factor * residual / len(seeds)
+        for link in links:
+            before = residuals[link]
+            residuals[link] = before + share
+            if before < threshold(link) <= before + share:
+                queue.append(link)
+    return dict(estimates)
+
+
+def sample_personalized(graph, damping_factor, seeds, walks=WALKS,
+                        rng=None):
+    """
+    Returns a dictionary from page number to rank, personalized to an
+    array of seed page numbers, estimated from `walks` random surfers
+    using the random generator or seed `rng`.
+
+    Each surfer starts at a random seed and stops before each move with
+    probability 1 - damping_factor, so the pages where they stop are
+    distributed by the personalized ranks. Surfers on pages with no
+    links move to a random seed.
+    """
+    rng = np.random.default_rng(rng)
+    positions = seeds[rng.integers(0, len(seeds), walks)]
+    stopped = []
+    while len(positions):
+        stops = rng.random(len(positions)) >= damping_factor
+        stopped.append(positions[stops])
+        positions = positions[~stops]
+
+        following = seeds[rng.integers(0, len(seeds), len(positions))]
+        moving = np.flatnonzero(~graph.dangling[positions])
+        origins = positions[moving]
+        following[moving] = graph.targets[
+            graph.offsets[origins] + rng.integers(0, graph.degrees[origins])
+        ]
+        positions = following
+
+    pages, counts = np.unique(np.concatenate(stopped), return_counts=True)
+    return dict(zip(pages.tolist(), (counts / walks).tolist()))
+
+
+def top(ranks, k):
+    """
+    Returns a list of the `k` highest ranked page numbers with their
+    ranks, in descending order, from an array or a dictionary of ranks.
+    Dictionaries are searched with a heap of size k and arrays by
+    partitioning, so neither is sorted in full.
+    """
+    if isinstance(ranks, dict):
+        return heapq.nlargest(k, ranks.items(), key=lambda item: item[1])
+    k = min(k, len(ranks))
+    if k <= 0:
+        return []
+    pages = np.argpartition(ranks, len(ranks) - k)[len(ranks) - k:]
+    pages = pages[np.argsort(-ranks[pages], kind="stable")]
+    return list(zip(pages.tolist(), ranks[pages].tolist()))